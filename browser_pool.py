@@ -0,0 +1,92 @@
+import logging
+import threading
+from contextlib import contextmanager
+from queue import Queue
+
+import undetected_chromedriver as uc
+
+# URL patterns (Network.setBlockedURLs wildcards) per resource group. Discovery
+# only reads DOM attributes, so none of these are needed to list products.
+BLOCKED_URL_PATTERNS = {
+    "images": ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*static.zara.net/assets/*", "*static.zara.net/photos/*"],
+    "media": ["*.mp4", "*.webm", "*.m3u8", "*.ts", "*.mp3"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "analytics": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+        "*connect.facebook.net*", "*facebook.com/tr*", "*bat.bing.com*", "*criteo.*",
+        "*analytics.tiktok.com*", "*ct.pinterest.com*", "*sc-static.net*", "*hotjar.com*",
+    ],
+}
+DEFAULT_BLOCKED = ("images", "media", "fonts", "analytics")
+
+class BrowserPool:
+    """
+    Fixed-size pool of long-lived undetected Chrome instances.
+
+    Browsers are started lazily on first lease, handed out one caller at a
+    time, and recycled (quit and replaced) after `max_pages` page loads or
+    whenever a lease ends with an exception. Requests matching the `blocked`
+    groups of BLOCKED_URL_PATTERNS are refused through CDP.
+    """
+
+    def __init__(self, size=3, max_pages=25, headless=True, blocked=DEFAULT_BLOCKED):
+        self.size = size
+        self.max_pages = max_pages
+        self.headless = headless
+        self.blocked = tuple(blocked)
+        self.lock = threading.Lock()
+        self.drivers = set()
+        # Each slot is None (not started yet) or [driver, pages_loaded]
+        self.slots = Queue()
+        for _ in range(size):
+            self.slots.put(None)
+
+    def _new_driver(self):
+        options = uc.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless=new")
+        if "images" in self.blocked:
+            options.add_argument("--blink-settings=imagesEnabled=false")
+        driver = uc.Chrome(options=options)
+        if self.blocked:
+            patterns = [pattern for group in self.blocked for pattern in BLOCKED_URL_PATTERNS[group]]
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        with self.lock:
+            self.drivers.add(driver)
+        logging.info(f"Started discovery browser (blocking: {', '.join(self.blocked) or 'nothing'})")
+        return driver
+
+    def _quit(self, driver):
+        with self.lock:
+            self.drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.info(f"[ERROR] Failed to quit browser: {e}")
+
+    @contextmanager
+    def lease(self):
+        """Borrow a browser for one page; blocks while all browsers are busy."""
+        slot = self.slots.get()
+        try:
+            if slot is None:
+                slot = [self._new_driver(), 0]
+            yield slot[0]
+        except Exception:
+            if slot is not None:
+                self._quit(slot[0])
+            self.slots.put(None)
+            raise
+        slot[1] += 1
+        if slot[1] >= self.max_pages:
+            logging.info(f"Recycling browser after {slot[1]} pages")
+            self._quit(slot[0])
+            slot = None
+        self.slots.put(slot)
+
+    def close(self):
+        with self.lock:
+            drivers = list(self.drivers)
+        for driver in drivers:
+            self._quit(driver)
@@ -0,0 +1,50 @@
+import logging
+
+import orjson
+
+CATALOG_FILE = "scrapes/master.json"
+
+def normalize_sku(sku_id):
+    """Shopify handles drop the leading zeros of Zara's 8 digit sku ids."""
+    return str(sku_id).strip().zfill(8)
+
+def normalize_color(color):
+    """Case- and whitespace-insensitive color name, e.g. ' Grey  Marl' -> 'grey marl'."""
+    return " ".join(str(color).split()).casefold()
+
+class CatalogIndex:
+    """
+    Scraped product entries indexed for joins with Shopify CSV rows.
+
+    Entries are keyed on (zero-padded sku_id, normalized color). As with the
+    linear scans this replaces, the first entry for a key wins.
+    """
+
+    def __init__(self, entries):
+        self.by_variant = {}
+        self.by_sku = {}
+        for product in entries:
+            sku_id = normalize_sku(product["sku_id"])
+            self.by_variant.setdefault((sku_id, normalize_color(product["color"])), product)
+            self.by_sku.setdefault(sku_id, product)
+
+    def __len__(self):
+        return len(self.by_variant)
+
+    def get(self, handle, color):
+        """The entry for a Shopify Handle and Option1 Value, or None."""
+        return self.by_variant.get((normalize_sku(handle), normalize_color(color)))
+
+    def gender(self, handle):
+        """Gender of any color of the product, lowercased, or None when unknown."""
+        product = self.by_sku.get(normalize_sku(handle))
+        if product is None:
+            return None
+        return product.get("gender", "").lower() or None
+
+def load_catalog(json_file=CATALOG_FILE):
+    """Build the index from a crawl output file (All.json, scrapes/master.json)."""
+    with open(json_file, "rb") as f:
+        catalog = CatalogIndex(orjson.loads(f.read()))
+    logging.info(f"Indexed {len(catalog)} product variants from {json_file}")
+    return catalog
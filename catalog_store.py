@@ -0,0 +1,302 @@
+import argparse
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from itertools import groupby
+
+import orjson
+
+from catalog_index import normalize_color, normalize_sku
+
+CATALOG_DB = "cache/catalog.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    sku_id TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    subcategory TEXT,
+    gender TEXT,
+    updated_at REAL,
+    row_index INTEGER
+);
+CREATE TABLE IF NOT EXISTS color_variants (
+    sku_id TEXT NOT NULL,
+    color_code TEXT NOT NULL,
+    color TEXT,
+    color_key TEXT,
+    price TEXT,
+    original_price TEXT,
+    image_urls TEXT,
+    product_link TEXT,
+    updated_at REAL,
+    PRIMARY KEY (sku_id, color_code)
+);
+CREATE INDEX IF NOT EXISTS color_variants_by_color ON color_variants (sku_id, color_key);
+CREATE TABLE IF NOT EXISTS size_variants (
+    sku_id TEXT NOT NULL,
+    color_code TEXT NOT NULL,
+    size TEXT NOT NULL,
+    position INTEGER,
+    PRIMARY KEY (sku_id, color_code, size)
+);
+CREATE INDEX IF NOT EXISTS size_variants_in_order ON size_variants (sku_id, color_code, position);
+CREATE TABLE IF NOT EXISTS store_availability (
+    sku_id TEXT NOT NULL,
+    color_code TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    size TEXT NOT NULL,
+    position INTEGER,
+    PRIMARY KEY (sku_id, color_code, store_id, size)
+);
+CREATE INDEX IF NOT EXISTS store_availability_in_order ON store_availability (sku_id, color_code, store_id, position);
+CREATE TABLE IF NOT EXISTS shopify_ids (
+    sku_id TEXT NOT NULL,
+    color_key TEXT NOT NULL,
+    size TEXT NOT NULL,
+    product_id TEXT,
+    variant_id TEXT,
+    PRIMARY KEY (sku_id, color_key, size)
+);
+"""
+
+def split_sizes(sizes):
+    """'S,M,' -> ['S', 'M']"""
+    return [size for size in (sizes or "").split(",") if size]
+
+def variant_key(row):
+    return row["sku_id"], row["color_code"]
+
+class CatalogStore:
+    """
+    SQLite store for everything known about the catalog: products, their
+    color and size variants, per-store availability and the Shopify ids they
+    were uploaded under.
+
+    Scrapers upsert crawl entries with upsert_entry(); exporters read them back
+    in the legacy product_entry shape with product_entries(). get() and
+    gender() match catalog_index.CatalogIndex, so the store can be used
+    wherever an index is expected.
+
+    Every write is its own short transaction, so processes sharing the
+    database (sharded crawls) only wait for each other's single upserts.
+    """
+
+    def __init__(self, path=CATALOG_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        # Sharded crawls write from several processes; wait for the lock rather than fail.
+        # Transactions are opened explicitly by _write()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Databases created before products.row_index existed
+        if "row_index" not in {column["name"] for column in self.conn.execute("PRAGMA table_info(products)")}:
+            self.conn.execute("ALTER TABLE products ADD COLUMN row_index INTEGER")
+
+    @contextmanager
+    def _write(self):
+        """One write transaction, holding the database write lock only for its statements."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def upsert_entry(self, product_entry, row_index=None):
+        """
+        Insert or replace one crawl entry (one sku + color) and its sizes and stores.
+
+        A product listed under several categories keeps the category of the
+        earliest categories CSV row it was crawled from, as
+        crawl_output.compact does; entries without a row_index (snapshot
+        imports) only set it when no crawled row has.
+        """
+        sku_id = normalize_sku(product_entry["sku_id"])
+        color_code = product_entry["color_code"]
+        now = time.time()
+        with self._write():
+            self.conn.execute(
+                "INSERT INTO products (sku_id, name, category, subcategory, gender, updated_at, row_index) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (sku_id) DO UPDATE SET name = excluded.name, gender = excluded.gender, "
+                "updated_at = excluded.updated_at, "
+                "category = CASE WHEN " + self._EARLIER_ROW + " THEN excluded.category ELSE category END, "
+                "subcategory = CASE WHEN " + self._EARLIER_ROW + " THEN excluded.subcategory ELSE subcategory END, "
+                "row_index = CASE WHEN " + self._EARLIER_ROW + " THEN excluded.row_index ELSE row_index END",
+                (sku_id, product_entry.get("name"), product_entry.get("category"), product_entry.get("subcategory"),
+                 product_entry.get("gender"), now, row_index),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO color_variants VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (sku_id, color_code, product_entry.get("color"), normalize_color(product_entry.get("color", "")),
+                 product_entry.get("price"), product_entry.get("original_price"), product_entry.get("image_urls"),
+                 product_entry.get("product_link"), now),
+            )
+            self.conn.execute("DELETE FROM size_variants WHERE sku_id = ? AND color_code = ?", (sku_id, color_code))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO size_variants VALUES (?, ?, ?, ?)",
+                [(sku_id, color_code, size, position) for position, size in enumerate(split_sizes(product_entry.get("sizes")))],
+            )
+            self.conn.execute("DELETE FROM store_availability WHERE sku_id = ? AND color_code = ?", (sku_id, color_code))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO store_availability VALUES (?, ?, ?, ?, ?)",
+                [(sku_id, color_code, str(store_id), size, position)
+                 for store_id, sizes in (product_entry.get("stores") or {}).items()
+                 for position, size in enumerate(split_sizes(sizes))],
+            )
+
+    # The incoming entry comes from an earlier categories row than the stored category
+    _EARLIER_ROW = "excluded.row_index < coalesce(row_index, excluded.row_index + 1)"
+
+    def upsert_shopify_row(self, row):
+        """Record the Shopify ID / Variant ID of a master CSV row (Handle, Option1/2 Value)."""
+        if not row.get("Variant ID"):
+            return
+        with self._write():
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shopify_ids VALUES (?, ?, ?, ?, ?)",
+                (normalize_sku(row["Handle"]), normalize_color(row["Option1 Value"]), row["Option2 Value"],
+                 row.get("ID"), row["Variant ID"]),
+            )
+
+    def close(self):
+        """Close the connection; safe to call more than once."""
+        with self.lock:
+            self.conn.close()
+
+    @staticmethod
+    def _entry(variant, sizes, stores):
+        """
+        Rebuild a legacy product_entry dict from a color_variants row joined
+        with products, its size_variants rows and its store_availability rows
+        (both in position order).
+        """
+        sku_id, color_code = variant_key(variant)
+        store_sizes = {}
+        for store in stores:
+            store_sizes[store["store_id"]] = store_sizes.get(store["store_id"], "") + store["size"] + ","
+        return {
+            "category": variant["category"],
+            "subcategory": variant["subcategory"],
+            "name": variant["name"],
+            "price": variant["price"],
+            "image_urls": variant["image_urls"],
+            "product_link": variant["product_link"],
+            "sku_id": sku_id,
+            "sizes": "".join(size["size"] + "," for size in sizes),
+            "gender": variant["gender"],
+            "original_price": variant["original_price"],
+            "color": variant["color"],
+            "color_code": color_code,
+            "stores": store_sizes,
+        }
+
+    _VARIANTS = (
+        "SELECT c.*, p.name, p.category, p.subcategory, p.gender FROM color_variants c "
+        "JOIN products p ON p.sku_id = c.sku_id"
+    )
+    _SIZES = "SELECT sku_id, color_code, size FROM size_variants"
+    _STORES = "SELECT sku_id, color_code, store_id, size FROM store_availability"
+
+    def product_entries(self, since=None):
+        """
+        Yield every stored variant as a product_entry dict, optionally only
+        those updated at or after `since` (a unix timestamp).
+
+        Variants, sizes and stores are read with three cursors in (sku_id,
+        color_code) order and merged as they stream, so memory use does not
+        grow with the catalog. Reads go through their own connection and
+        snapshot, so writers are not held up while the entries are consumed.
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            if since is None:
+                variants = conn.execute(self._VARIANTS + " ORDER BY c.sku_id, c.color_code")
+            else:
+                variants = conn.execute(self._VARIANTS + " WHERE c.updated_at >= ? ORDER BY c.sku_id, c.color_code", (since,))
+            sizes = groupby(conn.execute(self._SIZES + " ORDER BY sku_id, color_code, position"), key=variant_key)
+            stores = groupby(conn.execute(self._STORES + " ORDER BY sku_id, color_code, store_id, position"), key=variant_key)
+            size_group, store_group = next(sizes, None), next(stores, None)
+            for variant in variants:
+                key = variant_key(variant)
+                while size_group and size_group[0] < key:
+                    size_group = next(sizes, None)
+                while store_group and store_group[0] < key:
+                    store_group = next(stores, None)
+                yield self._entry(
+                    variant,
+                    size_group[1] if size_group and size_group[0] == key else (),
+                    store_group[1] if store_group and store_group[0] == key else (),
+                )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def get(self, handle, color):
+        """The product_entry for a Shopify Handle and Option1 Value, or None."""
+        with self.lock:
+            variant = self.conn.execute(
+                self._VARIANTS + " WHERE c.sku_id = ? AND c.color_key = ? LIMIT 1",
+                (normalize_sku(handle), normalize_color(color)),
+            ).fetchone()
+            if variant is None:
+                return None
+            key = variant_key(variant)
+            sizes = self.conn.execute(self._SIZES + " WHERE sku_id = ? AND color_code = ? ORDER BY position", key)
+            stores = self.conn.execute(self._STORES + " WHERE sku_id = ? AND color_code = ? ORDER BY store_id, position", key)
+            return self._entry(variant, sizes, stores)
+
+    def gender(self, handle):
+        with self.lock:
+            product = self.conn.execute("SELECT gender FROM products WHERE sku_id = ?", (normalize_sku(handle),)).fetchone()
+        if product is None:
+            return None
+        return (product["gender"] or "").lower() or None
+
+def import_snapshots(store, json_files=(), shopify_files=()):
+    """Load existing crawl JSON files and Shopify master CSVs into the store."""
+    for json_file in json_files:
+        with open(json_file, "rb") as f:
+            entries = orjson.loads(f.read())
+        for product_entry in entries:
+            store.upsert_entry(product_entry)
+        logging.info(f"Imported {len(entries)} entries from {json_file}")
+    for shopify_file in shopify_files:
+        count = 0
+        with open(shopify_file, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                store.upsert_shopify_row(row)
+                count += 1
+        logging.info(f"Imported {count} Shopify rows from {shopify_file}")
+
+def main():
+    logging.basicConfig(format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
+                        datefmt='%H:%M:%S',
+                        level=logging.INFO,
+                        stream=sys.stdout)
+    parser = argparse.ArgumentParser(description="Seed the SQLite catalog from existing JSON and CSV snapshots.")
+    parser.add_argument("--db", default=CATALOG_DB)
+    parser.add_argument("--json", nargs="*", default=[], help="crawl outputs, e.g. scrapes/master.json All.json")
+    parser.add_argument("--shopify", nargs="*", default=[], help="master CSVs with Shopify ids, e.g. master_merge.csv")
+    args = parser.parse_args()
+
+    store = CatalogStore(args.db)
+    import_snapshots(store, args.json, args.shopify)
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import csv
+import logging
+import re
+
+import requests
+
+from product_json import format_price
+from rate_limiter import get_limiter
+
+CATEGORY_PRODUCTS_URL = "https://www.zara.com/in/en/category/{category_id}/products?ajax=true"
+PRODUCT_URL = "https://www.zara.com/in/en/{keyword}-p{sku_id}.html?v1={product_id}&v2={category_id}"
+
+HEADERS = {
+    "accept": "application/json",
+    "accept-language": "en-US,en;q=0.9",
+    "cache-control": "no-cache",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
+}
+
+limiter = get_limiter("product_page")
+session = requests.Session()
+session.headers.update(HEADERS)
+
+def load_category_rows(file_paths):
+    """Read categories CSV rows from one or more files, numbering them in order."""
+    rows = []
+    for file_path in file_paths:
+        with open(file_path, mode="r", encoding="utf-8") as file:
+            rows.extend(csv.DictReader(file))
+    for row_index, row in enumerate(rows):
+        row["_row_index"] = row_index
+    return rows
+
+def category_id_from_url(category_url):
+    """The categories*.csv links carry the category id as their v1 parameter."""
+    match = re.search(r"[?&]v1=(\d+)", category_url)
+    return match.group(1) if match else None
+
+def iter_components(data):
+    """Yield every product component of a category-products response."""
+    for group in data.get("productGroups", []):
+        for element in group.get("elements", []):
+            for component in element.get("commercialComponents", []):
+                if component.get("type", "Product") == "Product" and component.get("seo"):
+                    yield component
+
+def listing_entry(component, category_id):
+    """
+    Reduce one product component to what discovery needs.
+
+    Returns:
+    - dict: sku_id, product_id (the v1 of the product URL), url, the
+      listing price formatted like the product page and the color ids shown.
+    """
+    seo = component["seo"]
+    sku_id = seo["seoProductId"]
+    product_id = str(seo.get("discernProductId") or component["id"])
+    price = component.get("price")
+    return {
+        "sku_id": sku_id,
+        "product_id": product_id,
+        "url": PRODUCT_URL.format(keyword=seo["keyword"], sku_id=sku_id, product_id=product_id, category_id=category_id),
+        "price": format_price(price) if price is not None else None,
+        "colors": [str(color.get("id")) for color in component.get("detail", {}).get("colors", [])],
+    }
+
+def fetch_category_products(category_url):
+    """
+    List every product of a category with one JSON request.
+
+    Returns:
+    - list | None: Listing entries in page order, or None when the endpoint
+      is unavailable (callers then fall back to the browser).
+    """
+    category_id = category_id_from_url(category_url)
+    if not category_id:
+        return None
+    url = CATEGORY_PRODUCTS_URL.format(category_id=category_id)
+    try:
+        limiter.acquire()
+        response = session.get(url, timeout=15)
+        limiter.report(response.status_code)
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        logging.info(f"[ERROR] Category listing request failed for {category_id}: {e}")
+        return None
+
+    listing = []
+    seen = set()
+    for component in iter_components(data):
+        try:
+            entry = listing_entry(component, category_id)
+        except KeyError as e:
+            logging.info(f"[DEBUG] Skipping listing component without {e}")
+            continue
+        key = (entry["sku_id"], entry["product_id"])
+        if key in seen:
+            continue
+        seen.add(key)
+        listing.append(entry)
+    if not listing:
+        return None
+    logging.info(f"Category {category_id}: {len(listing)} products from listing endpoint")
+    return listing
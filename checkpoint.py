@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import orjson
+
+CHECKPOINT_FILE = "cache/crawl_checkpoint.json"
+
+def task_key(item, row):
+    """A product task is one listing item discovered from one categories CSV row."""
+    return f"{row['_row_index']}:{item['url']}"
+
+def rows_signature(rows):
+    """Identifies the category list a checkpoint belongs to."""
+    links = [row.get("Link", "").strip() for row in rows]
+    return hashlib.sha1(orjson.dumps(links)).hexdigest()
+
+class Checkpoint:
+    """
+    Progress of a crawl, saved periodically so an interrupted run can resume.
+
+    Records the categories whose discovery finished, the product tasks whose
+    entries have been written, and the tasks that were queued or in flight
+    (with their listing items, so they can be resubmitted without
+    rediscovering their category). Each save copies this state, then calls
+    `flush`, then writes the copy, so the streamed output is on disk before
+    the checkpoint claims it is.
+    """
+
+    def __init__(self, rows, path=CHECKPOINT_FILE, interval=30.0, flush=None):
+        self.path = path
+        self.signature = rows_signature(rows)
+        self.interval = interval
+        self.flush = flush
+        self.lock = threading.Lock()
+        self.categories = set()
+        self.done = set()
+        self.pending = {}
+        self.finished = False
+        self.last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, rows, path=CHECKPOINT_FILE, **kwargs):
+        """Resume from `path`, or start fresh when it is missing or belongs to other categories."""
+        checkpoint = cls(rows, path, **kwargs)
+        if not os.path.exists(path):
+            logging.info(f"No checkpoint at {path}, starting from the beginning")
+            return checkpoint
+        with open(path, "rb") as f:
+            state = orjson.loads(f.read())
+        if state.get("signature") != checkpoint.signature:
+            logging.info(f"[WARNING] Checkpoint {path} is for a different category list, starting from the beginning")
+            return checkpoint
+        checkpoint.categories = set(state["categories"])
+        checkpoint.done = set(state["done"])
+        checkpoint.pending = state["pending"]
+        checkpoint.finished = state.get("finished", False)
+        logging.info(f"Resuming: {len(checkpoint.categories)} categories discovered, {len(checkpoint.done)} products done, "
+                     f"{len(checkpoint.pending)} pending")
+        return checkpoint
+
+    def is_known(self, key):
+        """True when the task was already written or is already queued."""
+        with self.lock:
+            return key in self.done or key in self.pending
+
+    def submitted(self, key, item, row_index):
+        with self.lock:
+            self.pending[key] = [item, row_index]
+
+    def completed(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+            self.done.add(key)
+        self.maybe_save()
+
+    def category_done(self, row_index):
+        with self.lock:
+            self.categories.add(row_index)
+        self.maybe_save()
+
+    def maybe_save(self):
+        if time.monotonic() - self.last_save >= self.interval:
+            self.save()
+
+    def save(self, finished=False):
+        # Snapshot first: entries completed after it may still be in the
+        # writer's buffer, entries completed before it are flushed below
+        with self.lock:
+            self.finished = self.finished or finished
+            self.last_save = time.monotonic()
+            data = orjson.dumps({
+                "signature": self.signature,
+                "categories": sorted(self.categories),
+                "done": sorted(self.done),
+                "pending": self.pending,
+                "finished": self.finished,
+            })
+        if self.flush:
+            self.flush()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import orjson
+
+def entry_key(product_entry):
+    """A product variant is identified by its sku and color code."""
+    return product_entry["sku_id"] + product_entry["color_code"]
+
+def rank(row_index, product_entry):
+    """Sort key deciding output order and which duplicate wins (the lowest)."""
+    return (row_index, entry_key(product_entry), product_entry["product_link"], product_entry["sizes"])
+
+def compact(tagged_entries):
+    """
+    Deduplicate and order crawl output deterministically.
+
+    Args:
+    - tagged_entries: (row_index, product_entry) pairs, where row_index is the
+      position of the categories CSV row the product was discovered from.
+
+    Returns:
+    - list: One entry per sku+color, taken from the earliest category row,
+      ordered by row then sku+color. The result depends only on what was
+      crawled, not on thread or process scheduling.
+    """
+    ordered = sorted(tagged_entries, key=lambda tagged: rank(*tagged))
+    seen = set()
+    entries = []
+    for _, product_entry in ordered:
+        key = entry_key(product_entry)
+        if key in seen:
+            continue
+        seen.add(key)
+        entries.append(product_entry)
+    return entries
+
+def write_json(entries, output_file):
+    """Write entries in the legacy All.json format."""
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=4)
+
+def drop_partial_line(path):
+    """Cut a crash-truncated last line off a JSONL file so appends start clean."""
+    with open(path, "r+b") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+
+class JsonlWriter:
+    """
+    Append-only crawl output: one {"row": row_index, "entry": product_entry}
+    orjson line per product.
+
+    Lines are buffered and written every `flush_every` records, or once the
+    oldest buffered line is `fsync_interval` seconds old. The file is fsynced
+    at most every `fsync_interval` seconds, and a background timer writes and
+    fsyncs whatever is still pending when no further writes arrive. After a
+    hard kill, at most the last `fsync_interval` seconds of output are lost,
+    and a partially written last line is skipped by read_jsonl().
+    """
+
+    def __init__(self, path, append=False, flush_every=50, fsync_interval=5.0):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if append and os.path.exists(path):
+            drop_partial_line(path)
+        self.file = open(path, "ab" if append else "wb")
+        self.lock = threading.Condition()
+        self.flush_every = flush_every
+        self.fsync_interval = fsync_interval
+        self.buffer = []
+        self.oldest = None
+        self.unsynced = False
+        self.last_fsync = time.monotonic()
+        self.timer = None
+        self.written = 0
+
+    def write(self, row_index, product_entry):
+        with self.lock:
+            if self.timer is None:
+                self.timer = threading.Thread(target=self._run_timer, name="jsonl-flush", daemon=True)
+                self.timer.start()
+            if not self.buffer:
+                self.oldest = time.monotonic()
+                self.lock.notify()
+            self.buffer.append(orjson.dumps({"row": row_index, "entry": product_entry}) + b"\n")
+            self.written += 1
+            if len(self.buffer) >= self.flush_every or time.monotonic() - self.oldest >= self.fsync_interval:
+                self._flush()
+
+    def _flush(self, sync=False):
+        # Caller holds self.lock
+        if self.buffer:
+            self.file.write(b"".join(self.buffer))
+            self.buffer = []
+            self.file.flush()
+            self.unsynced = True
+        if self.unsynced and (sync or time.monotonic() - self.last_fsync >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.unsynced = False
+            self.last_fsync = time.monotonic()
+
+    def _run_timer(self):
+        with self.lock:
+            while not self.file.closed:
+                if not self.buffer and not self.unsynced:
+                    self.lock.wait()
+                    continue
+                # Buffered lines are due fsync_interval after the oldest arrived, written unsynced ones after the last fsync
+                due = min(self.oldest if self.buffer else float("inf"),
+                          self.last_fsync if self.unsynced else float("inf")) + self.fsync_interval
+                if due > time.monotonic():
+                    self.lock.wait(due - time.monotonic())
+                    continue
+                self._flush(sync=True)
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self._flush(sync=True)
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self._flush(sync=True)
+            self.file.close()
+            self.lock.notify_all()
+        logging.info(f"Wrote {self.written} entries to {self.path}")
+
+def iter_jsonl(path):
+    """
+    Yield (offset, row_index, product_entry) for each line of a JsonlWriter
+    file, offset being where the line starts.
+
+    A truncated last line, left by a crash mid-write, is skipped.
+    """
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            start, offset = offset, offset + len(line)
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                logging.info(f"[DEBUG] Skipping incomplete line in {path}")
+                continue
+            yield start, record["row"], record["entry"]
+
+def read_jsonl(path):
+    """Read the (row_index, product_entry) pairs of a JsonlWriter file."""
+    return [(row_index, product_entry) for _, row_index, product_entry in iter_jsonl(path)]
+
+def iter_compacted(path):
+    """
+    Yield what compact(read_jsonl(path)) returns, without holding the entries
+    in memory. A first pass keeps only each sku+color's winning rank and line
+    offset; the winners are then read back one at a time, in order.
+    """
+    winners = {}
+    for offset, row_index, product_entry in iter_jsonl(path):
+        key = entry_key(product_entry)
+        entry_rank = rank(row_index, product_entry)
+        if key not in winners or entry_rank < winners[key][0]:
+            winners[key] = (entry_rank, offset)
+    with open(path, "rb") as f:
+        for _, offset in sorted(winners.values()):
+            f.seek(offset)
+            yield orjson.loads(f.readline())["entry"]
+
+def compact_jsonl(paths, output_file):
+    """Compact one or more JsonlWriter files into the legacy All.json."""
+    tagged = []
+    for path in paths:
+        tagged.extend(read_jsonl(path))
+    entries = compact(tagged)
+    write_json(entries, output_file)
+    logging.info(f"Compacted {len(tagged)} streamed entries into {len(entries)} products -> {output_file}")
+    return entries
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import orjson
+
+STATE_FILE = "cache/crawl_state.json"
+# Products are re-crawled at least this often even when their listing looks the same
+REFRESH_AGE = 3 * 24 * 3600
+
+def listing_key(item):
+    return f"{item['sku_id']}:{item['product_id']}"
+
+def listing_fingerprint(item):
+    """
+    Hash of what the category listing says about a product: its id, price and
+    color set. Browser-discovered listings have no colors, so their
+    fingerprint covers id and price only.
+    """
+    data = orjson.dumps([item["product_id"], item.get("price"), sorted(item.get("colors") or [])])
+    return hashlib.sha1(data).hexdigest()
+
+class CrawlState:
+    """
+    Per-product record of the last crawl, keyed by listing_key().
+
+    Stores the listing fingerprint, when the product was crawled and the
+    product entries that crawl produced. A product whose fingerprint is
+    unchanged and whose record is younger than refresh_age can reuse those
+    entries instead of fetching its page and store stock again. Crawls that
+    produced no entries are never reused: an empty result may be a failed
+    fetch or store-stock error as much as "no stock". They are still recorded,
+    so merge() lets them replace an older record from another process.
+    """
+
+    def __init__(self, path=STATE_FILE, refresh_age=REFRESH_AGE):
+        self.path = path
+        self.refresh_age = refresh_age
+        self.lock = threading.Lock()
+        self.products = {}
+        self.reused = 0
+        self.crawled = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.products = orjson.loads(f.read())
+            logging.info(f"Loaded crawl state for {len(self.products)} products from {path}")
+
+    def reusable(self, key, fingerprint):
+        """
+        Returns:
+        - list | None: The entries of the last crawl when the product can be
+          skipped, otherwise None.
+        """
+        with self.lock:
+            record = self.products.get(key)
+            if (record is None or not record["entries"] or record["fingerprint"] != fingerprint
+                    or time.time() - record["crawled_at"] > self.refresh_age):
+                return None
+            self.reused += 1
+            return record["entries"]
+
+    def record(self, key, fingerprint, entries):
+        with self.lock:
+            self.products[key] = {"fingerprint": fingerprint, "crawled_at": time.time(), "entries": entries}
+            self.crawled += 1
+
+    def merge(self, products):
+        """Fold in records saved by another process, keeping the most recent crawl of each product."""
+        with self.lock:
+            for key, record in products.items():
+                current = self.products.get(key)
+                if current is None or record["crawled_at"] > current["crawled_at"]:
+                    self.products[key] = record
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            data = orjson.dumps(self.products)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Saved crawl state for {len(self.products)} products "
+                     f"({self.crawled} crawled, {self.reused} unchanged this run)")
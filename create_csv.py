@@ -1,8 +1,14 @@
 import os
-import json
+import csv
 import pandas as pd
 import re
 import orjson
+from itertools import groupby
+from operator import itemgetter
+from catalog_index import load_catalog
+from catalog_store import CATALOG_DB, CatalogStore
+from crawl_output import iter_compacted
+from sku_index import KnownSkuIndex
 
 # Set to track unique product_id + color_code combinations
 unique_product_variants = set()
@@ -32,6 +38,63 @@ def clean_price(price):
     match = re.sub(r"[^\d.]", "", price)
     return match or "0"
 
+# Shopify product CSV columns, in output order; format_shopify_csv rows are tuples in this order
+SHOPIFY_COLUMNS = (
+    "Handle",
+    "Title",
+    "Body (HTML)",
+    "Vendor",
+    "Product Category",
+    "Type",
+    "Command",
+    "Tags",
+    "Published",
+    "Option1 Name",
+    "Option1 Value",
+    "Option2 Name",
+    "Option2 Value",
+    "Option3 Name",
+    "Option3 Value",
+    "Variant SKU",
+    "Variant Grams",
+    "Variant Inventory Tracker",
+    "Variant Inventory Qty",
+    "Variant Inventory Policy",
+    "Variant Fulfillment Service",
+    "Variant Price",
+    "Variant Compare At Price",
+    "Variant Requires Shipping",
+    "Variant Taxable",
+    "Variant Barcode",
+    "Image Src",
+    "Image Position",
+    "Image Alt Text",
+    "Gift Card",
+    "SEO Title",
+    "SEO Description",
+    "Google Shopping / Google Product Category",
+    "Google Shopping / Gender",
+    "Google Shopping / Age Group",
+    "Google Shopping / MPN",
+    "Google Shopping / AdWords Grouping",
+    "Google Shopping / AdWords Labels",
+    "Google Shopping / Condition",
+    "Google Shopping / Custom Product",
+    "Google Shopping / Custom Label 0",
+    "Google Shopping / Custom Label 1",
+    "Google Shopping / Custom Label 2",
+    "Google Shopping / Custom Label 3",
+    "Google Shopping / Custom Label 4",
+    "Variant Image",
+    "Variant Weight Unit",
+    "Variant Tax Code",
+    "Cost per item",
+    "Price / International",
+    "Compare At Price / International",
+    "Status",
+)
+HANDLE, COMMAND, IMAGE_SRC, IMAGE_POSITION = (SHOPIFY_COLUMNS.index(name) for name in ("Handle", "Command", "Image Src", "Image Position"))
+
 product_img_idx = {}
 
 sku_id_to_cc = {}
@@ -57,7 +120,8 @@ sku_id_to_cc = {}
 
 def format_shopify_csv(product):
     """
-    Format a single product dictionary into Shopify-compatible CSV rows.
+    Format a single product dictionary into Shopify-compatible CSV rows,
+    as tuples in SHOPIFY_COLUMNS order.
     """
     global unique_product_variants, product_img_idx, sku_id_to_cc
     rows = []
@@ -98,96 +162,141 @@ def format_shopify_csv(product):
 
     # Format rows for Shopify
     for idx, size in enumerate(sizes):
-        base_row = {
-            "Handle": product_id,
-            "Title": title if idx == 0 else "",
-            "Body (HTML)": "",
-            "Vendor": "Zara",
-            "Product Category": "",
-            "Type": category,
-            "Command": "REPLACE",
-            "Tags": tags if idx == 0 else "",
-            "Published": "TRUE" if idx == 0 else "",
-            "Option1 Name": "Color",
-            "Option1 Value": color_code,
-            "Option2 Name": "Size",
-            "Option2 Value": size.strip(),
-            "Option3 Name": "",
-            "Option3 Value": "",
-            "Variant SKU": "",
-            "Variant Grams": "",
-            "Variant Inventory Tracker": "shopify",
-            "Variant Inventory Qty": 1000,
-            "Variant Inventory Policy": "deny",
-            "Variant Fulfillment Service": "manual",
-            "Variant Price": price,
-            "Variant Compare At Price": original_price,
-            "Variant Requires Shipping": "TRUE",
-            "Variant Taxable": "",
-            "Variant Barcode": "",
-            "Image Src": image_urls[idx] if idx < len(image_urls) else "",
-            "Image Position": product_img_idx[product_id] if idx < len(image_urls) else "",
-            "Image Alt Text": "",
-            "Gift Card": "",
-            "SEO Title": "",
-            "SEO Description": "",
-            "Google Shopping / Google Product Category": "",
-            "Google Shopping / Gender": "",
-            "Google Shopping / Age Group": "",
-            "Google Shopping / MPN": "",
-            "Google Shopping / AdWords Grouping": "",
-            "Google Shopping / AdWords Labels": "",
-            "Google Shopping / Condition": "",
-            "Google Shopping / Custom Product": "",
-            "Google Shopping / Custom Label 0": "",
-            "Google Shopping / Custom Label 1": "",
-            "Google Shopping / Custom Label 2": "",
-            "Google Shopping / Custom Label 3": "",
-            "Google Shopping / Custom Label 4": "",
-            "Variant Image": image_urls[0] if image_urls else "",
-            "Variant Weight Unit": "",
-            "Variant Tax Code": "",
-            "Cost per item": "",
-            "Price / International": "",
-            "Compare At Price / International": "",
-            "Status": "active" if idx == 0 else "",
-        }
+        rows.append((
+            product_id,                                                   # Handle
+            title if idx == 0 else "",                                    # Title
+            "",                                                           # Body (HTML)
+            "Zara",                                                       # Vendor
+            "",                                                           # Product Category
+            category,                                                     # Type
+            "REPLACE",                                                    # Command
+            tags if idx == 0 else "",                                     # Tags
+            "TRUE" if idx == 0 else "",                                   # Published
+            "Color",                                                      # Option1 Name
+            color_code,                                                   # Option1 Value
+            "Size",                                                       # Option2 Name
+            size.strip(),                                                 # Option2 Value
+            "",                                                           # Option3 Name
+            "",                                                           # Option3 Value
+            "",                                                           # Variant SKU
+            "",                                                           # Variant Grams
+            "shopify",                                                    # Variant Inventory Tracker
+            1000,                                                         # Variant Inventory Qty
+            "deny",                                                       # Variant Inventory Policy
+            "manual",                                                     # Variant Fulfillment Service
+            price,                                                        # Variant Price
+            original_price,                                               # Variant Compare At Price
+            "TRUE",                                                       # Variant Requires Shipping
+            "",                                                           # Variant Taxable
+            "",                                                           # Variant Barcode
+            image_urls[idx] if idx < len(image_urls) else "",             # Image Src
+            product_img_idx[product_id] if idx < len(image_urls) else "", # Image Position
+            "",                                                           # Image Alt Text
+            "",                                                           # Gift Card
+            "",                                                           # SEO Title
+            "",                                                           # SEO Description
+            "",                                                           # Google Shopping / Google Product Category
+            "",                                                           # Google Shopping / Gender
+            "",                                                           # Google Shopping / Age Group
+            "",                                                           # Google Shopping / MPN
+            "",                                                           # Google Shopping / AdWords Grouping
+            "",                                                           # Google Shopping / AdWords Labels
+            "",                                                           # Google Shopping / Condition
+            "",                                                           # Google Shopping / Custom Product
+            "",                                                           # Google Shopping / Custom Label 0
+            "",                                                           # Google Shopping / Custom Label 1
+            "",                                                           # Google Shopping / Custom Label 2
+            "",                                                           # Google Shopping / Custom Label 3
+            "",                                                           # Google Shopping / Custom Label 4
+            image_urls[0] if image_urls else "",                          # Variant Image
+            "",                                                           # Variant Weight Unit
+            "",                                                           # Variant Tax Code
+            "",                                                           # Cost per item
+            "",                                                           # Price / International
+            "",                                                           # Compare At Price / International
+            "active" if idx == 0 else "",                                 # Status
+        ))
         if idx < len(image_urls): product_img_idx[product_id] += 1
-        rows.append(base_row)
 
     # Add extra rows for remaining images without size information
     for img_idx in range(len(sizes), len(image_urls)):
-        extra_row = {
-            "Handle": product_id,
-            "Command": "REPLACE",
-            "Image Src": image_urls[img_idx],
-            "Image Position": product_img_idx[product_id],
-        }
+        extra_row = [""] * len(SHOPIFY_COLUMNS)
+        extra_row[HANDLE], extra_row[COMMAND] = product_id, "REPLACE"
+        extra_row[IMAGE_SRC], extra_row[IMAGE_POSITION] = image_urls[img_idx], product_img_idx[product_id]
         product_img_idx[product_id] += 1
-        rows.append(extra_row)
+        rows.append(tuple(extra_row))
 
     return rows
 
-def process_shopify_csv(json_file, csv_file):
+def iter_products(json_file):
+    """
+    Yield product entries from a crawl output: a legacy JSON list, or a
+    streamed .jsonl file (crawl_output.JsonlWriter). A stream is compacted
+    the same way as All.json, so a crash-truncated last line is skipped and
+    duplicate sku+color entries resolve deterministically, but only keys and
+    offsets are held in memory. A JSON list is still parsed whole.
+    """
+    if json_file.endswith(".jsonl"):
+        yield from iter_compacted(json_file)
+    else:
+        with open(json_file, "rb") as f:
+            yield from orjson.loads(f.read())
+
+def write_shopify_csv(products, csv_file, known_skus=None):
+    """
+    Stream products into a Shopify CSV with a fixed SHOPIFY_COLUMNS header,
+    writing each product's rows as soon as they are formatted. Every
+    exported sku is added to `known_skus` (a sku_index.KnownSkuIndex), so
+    the next crawl skips it before it shows up in the master CSV.
+
+    Returns:
+    - int: Number of rows written.
+    """
+    count = 0
+    with open(csv_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(SHOPIFY_COLUMNS)
+        for product in products:
+            rows = format_shopify_csv(product)
+            writer.writerows(rows)
+            count += len(rows)
+            if known_skus is not None and rows:
+                known_skus.add(product["sku_id"])
+    if known_skus is not None:
+        known_skus.save()
+    return count
+
+def process_shopify_csv(json_file, csv_file, known_skus=None):
     """
     Process a single JSON file and convert it to Shopify-compatible CSV.
     """
     try:
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        all_rows = []
-        for product in data:
-            all_rows.extend(format_shopify_csv(product))
-        # Convert to DataFrame and save as CSV
-        df = pd.DataFrame(all_rows)
-        df.to_csv(csv_file, index=False, encoding="utf-8")
+        write_shopify_csv(iter_products(json_file), csv_file, known_skus)
         print(f"Converted {json_file} to {csv_file}")
     except Exception as e:
         print(f"Error processing {json_file}: {e}")
 
 import orjson
 
+def unknown_products(entries, known_skus):
+    """Drop entries whose sku is in known_skus; entries must come grouped by sku."""
+    for sku_id, colors in groupby(entries, key=itemgetter("sku_id")):
+        # Checked before any color is written, since writing adds the sku
+        if sku_id not in known_skus:
+            yield from colors
+
+def export_store_csv(store, csv_file, since=None, known_skus=None):
+    """
+    Convert products from a catalog_store.CatalogStore to Shopify-compatible
+    CSV, optionally only those updated at or after `since`. With known_skus,
+    only products not in it yet are exported, and they are then added.
+    """
+    entries = store.product_entries(since)
+    if known_skus is not None:
+        entries = unknown_products(entries, known_skus)
+    write_shopify_csv(entries, csv_file, known_skus)
+    print(f"Exported {store.path} to {csv_file}")
+
 def merge_json_files_fast(file1, file2, output_file):
     # Read and parse the first JSON file
     with open(file1, "rb") as f1:  # Read in binary mode for orjson
@@ -206,7 +315,7 @@ def merge_json_files_fast(file1, file2, output_file):
 
 # Example usage
 
-def process_product_data(shopify_file, inventory_file, json_file, output_file):
+def process_product_data(shopify_file, inventory_file, json_file, output_file, catalog=None):
     # Read Shopify product file
     df_shopify = pd.read_csv(shopify_file)
     
@@ -216,10 +325,8 @@ def process_product_data(shopify_file, inventory_file, json_file, output_file):
     # Read inventory file
     df_inventory = pd.read_csv(inventory_file)
     
-    # Read JSON file
-    with open(json_file, 'r') as f:
-        json_data = json.load(f)
-    df_json = pd.json_normalize(json_data)
+    # Index JSON entries by sku and color, unless a catalog store is given
+    catalog = catalog or load_catalog(json_file)
     
     # Ensure Handle is string type in both dataframes
     df_variants['Handle'] = df_variants['Handle'].astype(str)
@@ -241,19 +348,12 @@ def process_product_data(shopify_file, inventory_file, json_file, output_file):
         how='left'
     )
     
-    # Prepare JSON data for matching (handle and color)
-    # Remove leading zeros from sku_id to match Handle format
-    df_json['sku_id_cleaned'] = df_json['sku_id'].str.lstrip('0')
-    df_json['json_match_key'] = df_json['sku_id_cleaned'] + '_' + df_json['color']
-    
-    # Create corresponding match key in merged data
-    df_merged['json_match_key'] = df_merged['Handle'] + '_' + df_merged['Option1 Value'].astype(str)
-    
-    # Match with JSON data
-    df_final = df_merged.merge(
-        df_json[['json_match_key', 'product_link', 'color_code', 'gender']],
-        on='json_match_key',
-        how='left'
+    # Match with JSON data: one dict lookup per variant row
+    matches = [catalog.get(handle, color) or {} for handle, color in zip(df_merged['Handle'], df_merged['Option1 Value'].astype(str))]
+    df_final = df_merged.assign(
+        product_link=[product.get('product_link') for product in matches],
+        color_code=[product.get('color_code') for product in matches],
+        gender=[product.get('gender') for product in matches],
     )
     
     # Select and rename final columns
@@ -282,8 +382,22 @@ if __name__ == "__main__":
         last_upload_csv = "latest_masters/master_upload_19-12-2024.csv"
         new_products = "latest_masters/new_products_19122024.csv"
         full_new_json = "full_new.json"
-        merge_json_files_fast("latest_masters/All.json", "latest_masters/new_19122024.json", full_new_json)
-        process_product_data(last_upload_csv, variant_csv, full_new_json, "master_merge.csv")
+        if os.path.exists(CATALOG_DB):
+            # Every crawled product is already in the SQLite catalog
+            catalog = CatalogStore()
+            process_product_data(last_upload_csv, variant_csv, None, "master_merge.csv", catalog=catalog)
+            catalog.close()
+        else:
+            merge_json_files_fast("latest_masters/All.json", "latest_masters/new_19122024.json", full_new_json)
+            process_product_data(last_upload_csv, variant_csv, full_new_json, "master_merge.csv")
         print("Data processing complete. Check combined_product_data.csv")
     else:
-        process_shopify_csv(json_file, csv_file)
+        # The exported products are about to be uploaded; the crawler can skip them from now on
+        known_skus = KnownSkuIndex()
+        if os.path.exists(CATALOG_DB):
+            # Crawled products that are not on Shopify yet, straight from the SQLite catalog
+            catalog = CatalogStore()
+            export_store_csv(catalog, csv_file, known_skus=known_skus)
+            catalog.close()
+        else:
+            process_shopify_csv(json_file, csv_file, known_skus)
@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import logging
+import threading
+import time
+import zlib
+
+import aiohttp
+import brotli
+
+HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "accept-encoding": "br, gzip, deflate",
+    "accept-language": "en-US,en;q=0.9",
+    "cache-control": "no-cache",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.199 Safari/537.36",
+}
+
+def decode_body(raw_content, content_encoding):
+    """
+    Decompress a response body according to its Content-Encoding header.
+
+    Args:
+    - raw_content (bytes): Body exactly as it came off the wire.
+    - content_encoding (str): Value of the Content-Encoding header.
+
+    Returns:
+    - bytes: The decompressed body.
+    """
+    encodings = [enc.strip() for enc in (content_encoding or "").lower().split(",") if enc.strip()]
+    # Encodings are listed in the order they were applied, so undo them backwards
+    for enc in reversed(encodings):
+        if enc == "br":
+            raw_content = brotli.decompress(raw_content)
+        elif enc in ("gzip", "x-gzip"):
+            raw_content = gzip.decompress(raw_content)
+        elif enc == "deflate":
+            try:
+                raw_content = zlib.decompress(raw_content)
+            except zlib.error:
+                raw_content = zlib.decompress(raw_content, -zlib.MAX_WBITS)
+    return raw_content
+
+class FetchStats:
+    """Running counters for pages fetched by a FetchEngine."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.pages = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def record(self, size=None):
+        with self.lock:
+            if size is None:
+                self.errors += 1
+            else:
+                self.pages += 1
+                self.bytes += size
+
+    def pages_per_sec(self):
+        elapsed = time.monotonic() - self.started
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.pages} pages, {self.errors} errors, "
+                f"{self.bytes / 1e6:.1f} MB, {self.pages_per_sec():.2f} pages/sec")
+
+class FetchEngine:
+    """
+    Asyncio page fetcher that runs its event loop on a background thread.
+
+    One aiohttp session (and therefore one connection pool) is shared by every
+    request made through the engine, with a global and a per-host cap on
+    concurrent connections, optionally paced by a shared rate limiter. Bodies are requested compressed and decoded by
+    decode_body, so callers always receive plain bytes.
+    """
+
+    def __init__(self, headers=HEADERS, concurrency=32, per_host=8, timeout=30, limiter=None):
+        self.headers = headers
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.stats = FetchStats()
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="fetch-engine", daemon=True)
+            self._thread.start()
+
+    async def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                auto_decompress=False,
+            )
+        return self._session
+
+    async def _fetch(self, url, headers=None):
+        session = await self._get_session()
+        if self.limiter:
+            await self.limiter.acquire_async()
+        try:
+            async with session.get(url, headers=headers) as response:
+                if self.limiter:
+                    self.limiter.report(response.status)
+                raw_content = await response.read()
+                body = decode_body(raw_content, response.headers.get("content-encoding", ""))
+                if response.status >= 400:
+                    logging.info(f"[ERROR] HTTP {response.status} for {url}")
+                    self.stats.record(None)
+                    return response.status, response.headers, None
+                self.stats.record(len(body))
+                return response.status, response.headers, body
+        except Exception as e:
+            logging.info(f"[ERROR] Failed to fetch {url}. Exception {e}")
+            if self.limiter:
+                self.limiter.report(None)
+            self.stats.record(None)
+            return None, {}, None
+
+    def submit(self, url, headers=None):
+        """
+        Schedule a GET on the engine's loop.
+
+        Returns:
+        - concurrent.futures.Future: Resolves to (status, headers, body); body is
+          None on any network or HTTP error.
+        """
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, headers), self._loop)
+
+    def fetch(self, url, headers=None):
+        """Blocking helper around submit()."""
+        return self.submit(url, headers).result()
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        logging.info(f"Fetch engine closed: {self.stats.summary()}")
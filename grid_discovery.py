@@ -0,0 +1,103 @@
+import logging
+import re
+import time
+
+import orjson
+
+GRID_SELECTOR = "ul.product-grid__product-list li.product-grid-product"
+
+# Collects every grid item in one WebDriver round trip instead of three per product
+GRID_SCRIPT = """
+return JSON.stringify(Array.from(
+    document.querySelectorAll(arguments[0])
+).map(function (item) {
+    var link = item.querySelector('div.product-grid-product__figure a');
+    var price = item.querySelector('.money-amount__main');
+    return {
+        id: item.getAttribute('data-productid'),
+        href: link ? link.href : null,
+        price: price ? price.textContent : null
+    };
+}));
+"""
+
+# Resolves as soon as the grid grows past arguments[0] items, or once neither
+# the DOM (MutationObserver) nor the network (resource timing) has changed for
+# arguments[1] ms, or after arguments[2] ms at the latest.
+WAIT_FOR_GROWTH_SCRIPT = """
+var previous = arguments[0], idleMs = arguments[1], timeoutMs = arguments[2], selector = arguments[3];
+var done = arguments[arguments.length - 1];
+if (!window.__gridWatch) {
+    window.__gridWatch = {lastMutation: Date.now()};
+    performance.setResourceTimingBufferSize(10000);
+    new MutationObserver(function () { window.__gridWatch.lastMutation = Date.now(); })
+        .observe(document.body, {childList: true, subtree: true});
+}
+var started = Date.now(), quietSince = Date.now();
+var resources = performance.getEntriesByType('resource').length;
+(function poll() {
+    var count = document.querySelectorAll(selector).length;
+    if (count > previous) return done({count: count, reason: 'grew'});
+    var now = Date.now(), seen = performance.getEntriesByType('resource').length;
+    if (seen !== resources) { resources = seen; quietSince = now; }
+    var quiet = Math.min(now - quietSince, now - window.__gridWatch.lastMutation);
+    if (quiet >= idleMs) return done({count: count, reason: 'idle'});
+    if (now - started >= timeoutMs) return done({count: count, reason: 'timeout'});
+    setTimeout(poll, 100);
+})();
+"""
+
+def scroll_until_stable(driver, idle_ms=800, step_timeout=5.0, max_duration=180.0):
+    """
+    Scroll an infinite-scroll grid until it stops growing.
+
+    After each jump to the bottom, the browser itself reports when new
+    products appear, or when the page has gone quiet (no DOM mutations and
+    no new network requests for idle_ms). The loop stops at the first scroll
+    that adds nothing.
+
+    Returns:
+    - int: Number of products in the grid.
+    """
+    driver.set_script_timeout(step_timeout + 5)
+    count = driver.execute_script("return document.querySelectorAll(arguments[0]).length;", GRID_SELECTOR)
+    started = time.monotonic()
+    steps = 0
+    while time.monotonic() - started < max_duration:
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        result = driver.execute_async_script(WAIT_FOR_GROWTH_SCRIPT, count, idle_ms, int(step_timeout * 1000), GRID_SELECTOR)
+        steps += 1
+        if result["count"] <= count:
+            break
+        count = result["count"]
+    logging.info(f"Grid settled at {count} products after {steps} scrolls in {time.monotonic() - started:.1f}s")
+    return count
+
+def extract_grid(driver, category_id):
+    """
+    Read the loaded product grid of a category page.
+
+    Args:
+    - category_id (str): The category's v1, used as v2 of product URLs.
+
+    Returns:
+    - list: Listing entries (sku_id, product_id, url, price) in grid order,
+      in the same shape as category_client.fetch_category_products.
+    """
+    items = orjson.loads(driver.execute_script(GRID_SCRIPT, GRID_SELECTOR))
+    listing = []
+    for item in items:
+        href, product_id = item.get("href"), item.get("id")
+        sku_match = re.search(r'p(\d+)\.html', href or "")
+        if not sku_match or not product_id:
+            logging.info(f"[ERROR] Failed to extract product URL from grid item {item}")
+            continue
+        price = item.get("price")
+        listing.append({
+            "sku_id": sku_match.group(1),
+            "product_id": product_id,
+            "url": href.split("?")[0] + "?v1=" + product_id + "&v2=" + category_id,
+            "price": re.sub(r"[^\d.,]", "", price) if price else None,
+        })
+    logging.info(f"Extracted {len(listing)} grid products in one script call")
+    return listing
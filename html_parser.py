@@ -0,0 +1,168 @@
+import functools
+import importlib.util
+import os
+import re
+
+# Fastest available backend first; override with ZARA_HTML_BACKEND=selectolax|lxml|bs4
+BACKEND_ORDER = ["selectolax", "lxml", "bs4"]
+
+def _pick_backend():
+    requested = os.environ.get("ZARA_HTML_BACKEND")
+    if requested:
+        if requested not in BACKEND_ORDER:
+            raise ValueError(f"Unknown HTML backend {requested!r}, expected one of {BACKEND_ORDER}")
+        return requested
+    for name in BACKEND_ORDER:
+        if importlib.util.find_spec(name) is not None:
+            if name == "lxml" and importlib.util.find_spec("cssselect") is None:
+                continue
+            return name
+    raise ImportError("No HTML parser backend available (install selectolax, lxml+cssselect or beautifulsoup4)")
+
+BACKEND = _pick_backend()
+
+if BACKEND == "selectolax":
+    from selectolax.lexbor import LexborHTMLParser
+elif BACKEND == "lxml":
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+    _LXML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+else:
+    import soupsieve
+    from bs4 import BeautifulSoup
+    _BS4_FEATURES = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+def compile_selector(selector):
+    """Compile one CSS selector for the active backend."""
+    if BACKEND == "lxml":
+        return CSSSelector(selector)
+    if BACKEND == "bs4":
+        return soupsieve.compile(selector)
+    # lexbor compiles selectors internally; keep the string
+    return selector
+
+@functools.lru_cache(maxsize=None)
+def _compiled(selector):
+    return compile_selector(selector)
+
+def compile_plan(selectors):
+    """
+    Compile a {name: css} mapping once, typically at import time.
+
+    Returns:
+    - dict: {name: compiled selector} to pass to Node.select / select_one.
+    """
+    return {name: compile_selector(selector) for name, selector in selectors.items()}
+
+class Node:
+    """
+    Backend-neutral wrapper around a parsed element.
+
+    select / select_one take a compiled selector, or a CSS string that is
+    compiled on first use and cached.
+    """
+
+    __slots__ = ("el",)
+
+    def __init__(self, el):
+        self.el = el
+
+    def select(self, compiled):
+        if isinstance(compiled, str):
+            compiled = _compiled(compiled)
+        if BACKEND == "lxml":
+            return [Node(el) for el in compiled(self.el)]
+        if BACKEND == "bs4":
+            return [Node(el) for el in compiled.select(self.el)]
+        return [Node(el) for el in self.el.css(compiled)]
+
+    def select_one(self, compiled):
+        if isinstance(compiled, str):
+            compiled = _compiled(compiled)
+        if BACKEND == "lxml":
+            found = compiled(self.el)
+            return Node(found[0]) if found else None
+        if BACKEND == "bs4":
+            el = compiled.select_one(self.el)
+        else:
+            el = self.el.css_first(compiled)
+        return Node(el) if el is not None else None
+
+    @property
+    def text(self):
+        if BACKEND == "lxml":
+            return self.el.text_content()
+        if BACKEND == "bs4":
+            return self.el.get_text()
+        return self.el.text(deep=True)
+
+    def get(self, attr, default=None):
+        if BACKEND == "selectolax":
+            value = self.el.attributes.get(attr)
+            return default if value is None else value
+        return self.el.get(attr, default)
+
+    def __getitem__(self, attr):
+        value = self.get(attr)
+        if value is None:
+            raise KeyError(attr)
+        return value
+
+def parse(raw_content):
+    """
+    Parse an HTML document straight from bytes.
+
+    Returns:
+    - Node: The document root.
+    """
+    if BACKEND == "selectolax":
+        return Node(LexborHTMLParser(raw_content).root)
+    if BACKEND == "lxml":
+        return Node(lxml.html.fromstring(raw_content, parser=_LXML_PARSER))
+    return Node(BeautifulSoup(raw_content, _BS4_FEATURES, from_encoding="utf-8"))
+
+_DIV_TAG = re.compile(rb"<(/?)div\b", re.IGNORECASE)
+
+def element_pattern(class_name):
+    """Byte pattern for the opening <div> whose class list contains class_name exactly."""
+    token = re.escape(class_name.encode())
+    return re.compile(rb'<div\b[^>]*\bclass="(?:[^"]*\s)?' + token + rb'(?:\s[^"]*)?"', re.IGNORECASE)
+
+def slice_element(raw_content, pattern):
+    """
+    Cut the bytes of one <div> subtree out of a page without parsing it.
+
+    Returns:
+    - bytes | None: From the opening tag matched by pattern to its balancing
+      </div>, or None when the element is missing or never closes.
+    """
+    match = pattern.search(raw_content)
+    if not match:
+        return None
+    depth = 0
+    for tag in _DIV_TAG.finditer(raw_content, match.start()):
+        if tag.group(1):
+            depth -= 1
+            if depth == 0:
+                end = raw_content.find(b">", tag.end())
+                return raw_content[match.start():end + 1] if end != -1 else None
+        else:
+            depth += 1
+    return None
+
+def parse_region(raw_content, pattern, root_selector):
+    """
+    Build a tree for just one element of the page.
+
+    Args:
+    - pattern: Byte pattern from element_pattern() locating the element.
+    - root_selector: Compiled selector for the element inside the fragment.
+
+    Returns:
+    - Node | None: The element, or None when it could not be isolated (the
+      caller should then parse the whole page).
+    """
+    fragment = slice_element(raw_content, pattern)
+    if fragment is None:
+        return None
+    return parse(fragment).select_one(root_selector)
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+
+CACHE_FILE = "cache/page_cache.json"
+
+def canonical_url(url):
+    """
+    Reduce a product URL to the key used by the cache.
+
+    v1 selects the color the parsed fields describe (see
+    product_json.pick_color), so it is kept. v2 only records which listing
+    the link came from and is dropped along with the fragment.
+    """
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc.lower()}{parts.path}"
+    v1 = parse_qs(parts.query).get("v1")
+    return f"{key}?v1={v1[0]}" if v1 else key
+
+class PageCache:
+    """
+    On-disk conditional-GET cache for product pages.
+
+    For every canonical URL it keeps the ETag / Last-Modified validators, a
+    SHA-256 of the last body and the fields parsed from that body. A 304, or a
+    200 whose body hashes to the stored value, returns the stored fields so
+    the page does not have to be parsed again. Each entry also records when
+    the page was last checked, so copies saved by separate processes can be
+    merged (see merge()).
+    """
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.entries = orjson.loads(f.read())
+            logging.info(f"Loaded {len(self.entries)} cached pages from {path}")
+
+    def request_headers(self, url):
+        """Conditional headers for url, or None when nothing reusable is cached."""
+        with self.lock:
+            entry = self.entries.get(canonical_url(url))
+        if not entry or "parsed" not in entry:
+            return None
+        headers = {}
+        if entry.get("etag"):
+            headers["if-none-match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["if-modified-since"] = entry["last_modified"]
+        return headers or None
+
+    def lookup(self, url, status, headers, body):
+        """
+        Check a response against the cache.
+
+        Returns:
+        - dict | None: The previously parsed fields when the page is unchanged,
+          otherwise None (and the new validators are recorded, awaiting
+          store_parsed()).
+        """
+        key = canonical_url(url)
+        with self.lock:
+            entry = self.entries.get(key, {})
+            if status == 304 and "parsed" in entry:
+                entry["checked_at"] = time.time()
+                self.hits += 1
+                return entry["parsed"]
+            body_hash = hashlib.sha256(body).hexdigest() if body is not None else None
+            validators = {
+                "etag": headers.get("etag"),
+                "last_modified": headers.get("last-modified"),
+                "body_hash": body_hash,
+                "checked_at": time.time(),
+            }
+            if body_hash and body_hash == entry.get("body_hash") and "parsed" in entry:
+                entry.update(validators)
+                self.hits += 1
+                return entry["parsed"]
+            self.entries[key] = validators
+            self.misses += 1
+            return None
+
+    def store_parsed(self, url, parsed):
+        """Attach freshly parsed fields to the entry recorded by lookup()."""
+        with self.lock:
+            entry = self.entries.get(canonical_url(url))
+            if entry is not None:
+                entry["parsed"] = parsed
+
+    def merge(self, entries):
+        """Fold in entries saved by another process, keeping the most recently checked copy of each page."""
+        with self.lock:
+            for key, entry in entries.items():
+                current = self.entries.get(key)
+                if current is None or entry.get("checked_at", 0) > current.get("checked_at", 0):
+                    self.entries[key] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            data = orjson.dumps(self.entries)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Saved {len(self.entries)} cached pages ({self.hits} hits, {self.misses} misses this run)")
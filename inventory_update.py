@@ -1,8 +1,16 @@
 import csv
 import json
+import os
 import re
 import requests
-import time
+from rate_limiter import get_limiter
+from catalog_index import CatalogIndex
+from catalog_store import CATALOG_DB, CatalogStore
+from season_suffix import get_resolver
+from store_stock import STORE_IDS, select_available, sizes_by_store
+
+store_limiter = get_limiter("store_stock")
+suffix_resolver = get_resolver()
 
 # Size mapping function
 size_map = {
@@ -28,14 +36,15 @@ def load_json(json_file):
     with open(json_file, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def build_api_url(references, gender):
-    """Construct the API URL for stock check."""
-    suf_list = ["-I2024", "-V2025"]
-    base_url = "https://www.zara.com/in/en/store-stock?physicalStoreIds=16156&"
+def build_api_url(references, gender, sufs):
+    """Construct the API URL for stock check, e.g. sufs=['V2025']."""
+    base_url = "https://www.zara.com/in/en/store-stock?"
+    for store_id in STORE_IDS:
+        base_url += f"physicalStoreIds={store_id}&"
 
     for ref in references:
-        for suf in suf_list:
-            base_url += f"references={ref}{suf}&"
+        for suf in sufs:
+            base_url += f"references={ref}-{suf}&"
 
     base_url += f"sectionName={gender.upper()}&ajax=true"
     return base_url
@@ -51,7 +60,9 @@ def check_availability(api_url):
 
     try:
         print(f"Calling API: {api_url}")  # Debug: Print API URL
+        store_limiter.acquire()
         response = requests.get(api_url, headers=headers, timeout=10)  # Added timeout
+        store_limiter.report(response.status_code)
         print(f"Response Status: {response.status_code}")  # Debug: Print status code
         response.raise_for_status()
         return response.json()
@@ -62,10 +73,10 @@ def check_availability(api_url):
     return {"productAvailability": []}
 
 
-def process_csv_and_json(csv_file, json_file, output_file):
-    """Process the CSV and JSON files to update inventory."""
-    # Load JSON data
-    json_data = load_json(json_file)
+def process_csv_and_json(csv_file, json_file, output_file, catalog=None):
+    """Process the CSV and JSON files (or a catalog store) to update inventory."""
+    # Load JSON data, indexed by sku and color for match_json
+    json_data = catalog or CatalogIndex(load_json(json_file))
 
     # Read the CSV file
     with open(csv_file, "r", encoding="utf-8") as infile, open(output_file, "w", encoding="utf-8", newline="") as outfile:
@@ -106,13 +117,10 @@ def process_csv_and_json(csv_file, json_file, output_file):
             process_group(references, rows_to_update, writer, json_data, gender)
 
 def match_json(row, json_data):
-    """Match JSON entry based on Handle and Option1 Value."""
-    handle = row["Handle"].zfill(8)  # Pad handle to 8 digits
-    option1_value = row["Option1 Value"]
-
-    for product in json_data:
-        if product["sku_id"] == handle and product["color"].lower() == option1_value.lower():
-            return product["sku_id"], product["color_code"], product.get("gender", "").lower()
+    """Match JSON entry (a CatalogIndex or CatalogStore) based on Handle and Option1 Value."""
+    product = json_data.get(row["Handle"], row["Option1 Value"])
+    if product:
+        return product["sku_id"], product["color_code"], product.get("gender", "").lower()
     return None, None, None
 
 # from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -123,21 +131,17 @@ def process_group(references, rows_to_update, writer, json_data, gender):
         print(f"[WARNING] Gender not found for this group.")
         return
 
-    api_url = build_api_url(references, gender)
-    availability_data = check_availability(api_url)
-    time.sleep(0.05)
+    suf, availability_data = suffix_resolver.resolve(
+        references[0],
+        lambda sufs: check_availability(build_api_url(references, gender, sufs)),
+    )
 
-    # Extract available references from the API response
-    available_refs = []
-    for store in availability_data.get("productAvailability", []):
-        for product in store.get("availableProducts", []):
-            available_refs.append(product["reference"])
+    # Available references across the configured stores, per STORE_POLICY
+    available_refs = list(select_available(sizes_by_store(availability_data)))
     
-    suff = ""
-    if len(available_refs):
-        suff = available_refs[0][-6:]
-    else: 
+    if not available_refs:
         return
+    suff = "-" + suf
 
     # Update rows and write to the new CSV
     for row in rows_to_update:
@@ -156,5 +160,8 @@ if __name__ == "__main__":
     json_file = "scrapes/master.json"        # Input JSON file
     output_file = "output_2.csv"      # Output CSV file
 
-    process_csv_and_json(csv_file, json_file, output_file)
+    # The SQLite catalog when it has been built, the JSON snapshot otherwise
+    catalog = CatalogStore() if os.path.exists(CATALOG_DB) else None
+    process_csv_and_json(csv_file, json_file, output_file, catalog=catalog)
+    suffix_resolver.save()
     print(f"Processing completed. Output saved to {output_file}")
@@ -1,9 +1,18 @@
+import argparse
 import csv
 import json
 import logging
+import os
 import sys
 import time
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from catalog_index import load_catalog
+from catalog_store import CATALOG_DB, CatalogStore
+from imports_common import extract_size, size_map
+from rate_limiter import get_limiter
+from season_suffix import get_resolver
+from store_stock import build_url, chunk_references, merge_responses, select_available, sizes_by_store
 
 logging.basicConfig(filename=f"logs/inventory_fetch{time.time()}.log",
                     filemode='a',
@@ -12,16 +21,69 @@ logging.basicConfig(filename=f"logs/inventory_fetch{time.time()}.log",
                     level=logging.DEBUG)
 logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
 
-def create_api_string(sku_base, colors, suf, gender="WOMAN"):
-    s = "https://www.zara.com/in/en/store-stock?physicalStoreIds=16156"
-    for color in colors:
-        ref = f"&references={sku_base}{color}"
-        for i in range(1, 8):
-            s += ref + ("0" if(i < 10) else "") + str(i) + suf
-        for i in range(26, 50, 2):
-            s += ref + ("0" if(i < 10) else "") + str(i) + suf       
-    s += f"&sectionName={gender}&ajax=true"
-    return s
+store_limiter = get_limiter("store_stock")
+suffix_resolver = get_resolver()
+
+# Every code the old blind query asked for, used when nothing is known about a color
+BLIND_SIZE_CODES = [f"{i:02d}" for i in range(1, 8)] + [str(i) for i in range(26, 50, 2)]
+LETTER_SIZE_CODES = sorted(set(size_map.values()))
+# Probe mode also asks for sizes next to the known ones. Without it only known
+# sizes are queried, so the new-sizes CSV stays empty; scheduled refreshes
+# should run with --probe-new-sizes.
+PROBE_NEW_SIZES = False
+CHUNK_WORKERS = 4
+
+chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="inventory-chunk")
+
+def build_size_catalog(rows):
+    """
+    Size codes each color of a handle is known to come in.
+
+    Args:
+    - rows: master_merge.csv rows of one handle.
+
+    Returns:
+    - dict: color_code -> set of size codes, e.g. {'802': {'01', '03'}}. A
+      color whose sizes are all "Unknown" maps to an empty set, so
+      create_api_strings() falls back to BLIND_SIZE_CODES for it.
+    """
+    catalog = {}
+    for row in rows:
+        codes = catalog.setdefault(row['color_code'], set())
+        code = extract_size(row['Option2 Value'])
+        if code != "Unknown":
+            codes.add(code)
+    return catalog
+
+def probe_codes(codes):
+    """Known codes plus their plausible neighbours (other letter sizes, the next EU sizes either side)."""
+    probed = set(codes)
+    if probed & set(LETTER_SIZE_CODES):
+        probed.update(LETTER_SIZE_CODES)
+    numeric = sorted(int(code) for code in codes if code not in LETTER_SIZE_CODES)
+    if numeric:
+        step = 2 if all(n % 2 == 0 for n in numeric) else 1
+        probed.update(str(n) for n in range(numeric[0] - 2, numeric[-1] + 3, step))
+    return probed
+
+def create_api_strings(sku_base, size_catalog, sufs, gender="WOMAN", probe=PROBE_NEW_SIZES):
+    """
+    Store-stock URLs for the plausible references of a handle.
+
+    Args:
+    - size_catalog: color_code -> size codes, from build_size_catalog().
+    - sufs: Season suffixes to ask for, e.g. ['V2025'].
+
+    Returns:
+    - list: URLs, each within store_stock.MAX_URL_LENGTH.
+    """
+    references = []
+    for color, codes in size_catalog.items():
+        codes = (probe_codes(codes) if probe else codes) or BLIND_SIZE_CODES
+        for code in sorted(codes):
+            for suf in sufs:
+                references.append(f"{sku_base}{color}{code}-{suf}")
+    return [build_url(chunk, gender) for chunk in chunk_references(references, gender)]
 
 headers = {
     "accept": "application/json",
@@ -30,187 +92,101 @@ headers = {
     "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
 }
 
-def fetch_inventory(sku_base, colors, gender="WOMAN"):
-    suf_list = ["-I2024", "-V2025"]
-    for suf in suf_list:
-        url = create_api_string(sku_base, colors, suf, gender)
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            if len(data.get("productAvailability", [])):       
-                logging.info(f"[DEBUG] product {sku_base} FOUND in store")
-                return data
-        except requests.RequestException as e:
-            logging.info(f"Error fetching store availability for: {e}")
+def fetch_url(url):
+    try:
+        store_limiter.acquire()
+        response = requests.get(url, headers=headers)
+        store_limiter.report(response.status_code)
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException as e:
+        logging.info(f"Error fetching store availability for: {e}")
+        return {"productAvailability": []}
+
+def fetch_inventory(sku_base, size_catalog, gender="WOMAN", probe=PROBE_NEW_SIZES):
+    def lookup(sufs):
+        urls = create_api_strings(sku_base, size_catalog, sufs, gender, probe)
+        return merge_responses(chunk_executor.map(fetch_url, urls))
+
+    suf, data = suffix_resolver.resolve(sku_base, lookup)
+    if len(data.get("productAvailability", [])):
+        logging.info(f"[DEBUG] product {sku_base} FOUND in store ({suf})")
+        return data
     logging.info(f"[TRACE] product {sku_base} NOT AVAILABLE in store")            
     return {"productAvailability": []}
 
-def process_inventory_changes(master_file, output_removal_file, output_new_file):
-    """
-    Process inventory changes using the combined master file.
-    
-    Args:
-        master_file: Path to our combined CSV file
-        output_removal_file: Path to save items that are no longer in stock
-        output_new_file: Path to save newly available items
-    """
-    # Group products by Handle and color_code
-    products_by_handle = {}
-    
-    # Read the master file and organize data
-    with open(master_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            handle = row['Handle']
-            if handle not in products_by_handle:
-                products_by_handle[handle] = {
-                    'color_codes': set(),
-                    'sizes_by_color': {},
-                    'rows_by_key': {},
-                    'product_link': row['product_link']
-                }
-            
-            color = row['Option1 Value']
-            color_code = row['color_code']
-            size = row['Option2 Value']
-            
-            products_by_handle[handle]['color_codes'].add(color_code)
-            if color not in products_by_handle[handle]['sizes_by_color']:
-                products_by_handle[handle]['sizes_by_color'][color] = set()
-            products_by_handle[handle]['sizes_by_color'][color].add(size)
-            
-            # Store the full row for later use
-            key = f"{handle}_{color}_{size}"
-            products_by_handle[handle]['rows_by_key'][key] = row
-
-    # Process each product
-    removed_items = []
-    new_items = []
-    
-    for handle, product_data in products_by_handle.items():
-        sku_base = handle.zfill(8)  # Pad with zeros to match Zara's format
-        colors = list(product_data['color_codes'])
-        
-        # Fetch current inventory
-        inventory_data = fetch_inventory(sku_base, colors)
-        
-        # Process inventory data
-        current_sizes_by_color = {}
-        for store in inventory_data.get('productAvailability', []):
-            for item in store.get('availableProducts', []):
-                color_code = item['reference'][-11:-8]
-                size = item['size']
-                
-                if color_code not in current_sizes_by_color:
-                    current_sizes_by_color[color_code] = set()
-                current_sizes_by_color[color_code].add(size)
-
-        # Compare with existing data and identify changes
-        for color, existing_sizes in product_data['sizes_by_color'].items():
-            color_code = next((code for code in colors if code in product_data['color_codes']), None)
-            if not color_code:
-                continue
-                
-            current_sizes = current_sizes_by_color.get(color_code, set())
-            
-            # Find removed sizes
-            removed_sizes = existing_sizes - current_sizes
-            for size in removed_sizes:
-                key = f"{handle}_{color}_{size}"
-                row = product_data['rows_by_key'].get(key)
-                if row:
-                    row = row.copy()
-                    row['Variant Inventory Adjust'] = 0
-                    removed_items.append(row)
-            
-            # Find new sizes
-            new_sizes = current_sizes - existing_sizes
-            for size in new_sizes:
-                # Create new row based on existing color variant
-                base_key = f"{handle}_{color}_{next(iter(existing_sizes))}"  # Get any existing size as template
-                base_row = product_data['rows_by_key'].get(base_key)
-                if base_row:
-                    new_row = base_row.copy()
-                    new_row['Option2 Value'] = size
-                    new_row['Variant Inventory Qty'] = 1000
-                    new_row['Command'] = 'MERGE'
-                    new_items.append(new_row)
-
-    # Write removed items
-    if removed_items:
-        write_removal_csv(output_removal_file, removed_items)
-        
-    # Write new items
-    if new_items:
-        write_new_sizes_csv(output_new_file, new_items)
+REMOVAL_FIELDNAMES = [
+    'ID', 'Handle', 'Variant ID', 'Option1 Name', 'Option1 Value', 
+    'Option2 Name', 'Option2 Value', 'Variant Inventory Adjust', 
+    'Variant Inventory Adjust'  # Duplicated field as per format
+]
+
+NEW_SIZES_FIELDNAMES = [
+    'Handle', 'Vendor', 'Type',
+    'Command', 'Published', 'Option1 Name', 'Option1 Value',
+    'Option2 Name', 'Option2 Value', 'Variant Inventory Tracker',
+    'Variant Inventory Qty', 'Variant Inventory Policy',
+    'Variant Fulfillment Service', 'Variant Price', 'Variant Compare At Price',
+    'Variant Requires Shipping', 'Variant Image', 'Status'
+]
+
+def removal_row(row):
+    """A master row in the exact removal CSV format."""
+    return {
+        'ID': row['ID'],
+        'Handle': row['Handle'],
+        'Variant ID': row['Variant ID'],
+        'Option1 Name': 'Color',
+        'Option1 Value': row['Option1 Value'],
+        'Option2 Name': 'Size',
+        'Option2 Value': row['Option2 Value'],
+        'Variant Inventory Adjust': 0
+    }
+
+def new_size_row(row):
+    """A new-size row in the exact new sizes CSV format."""
+    return {
+        'Handle': row['Handle'].zfill(8),  # Ensure 8 digits
+        'Vendor': 'Zara',
+        'Type': row.get('Type', ''),  # Get from original row if available
+        'Command': 'MERGE',
+        'Published': 'TRUE',
+        'Option1 Name': 'Color',
+        'Option1 Value': row['Option1 Value'],
+        'Option2 Name': 'Size',
+        'Option2 Value': row['Option2 Value'],
+        'Variant Inventory Tracker': 'shopify',
+        'Variant Inventory Qty': 1000,
+        'Variant Inventory Policy': 'deny',
+        'Variant Fulfillment Service': 'manual',
+        'Variant Price': row['Variant Price'],
+        'Variant Compare At Price': row['Variant Compare At Price'],
+        'Variant Requires Shipping': 'TRUE',
+        'Variant Image': row.get('Variant Image', ''),
+        'Status': 'active'
+    }
 
 def write_removal_csv(filename, rows):
     """
     Write rows to removal CSV with the exact required format.
     """
-    fieldnames = [
-        'ID', 'Handle', 'Variant ID', 'Option1 Name', 'Option1 Value', 
-        'Option2 Name', 'Option2 Value', 'Variant Inventory Adjust', 
-        'Variant Inventory Adjust'  # Duplicated field as per format
-    ]
-    
     with open(filename, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=REMOVAL_FIELDNAMES)
         writer.writeheader()
         
         for row in rows:
-            output_row = {
-                'ID': row['ID'],
-                'Handle': row['Handle'],
-                'Variant ID': row['Variant ID'],
-                'Option1 Name': 'Color',
-                'Option1 Value': row['Option1 Value'],
-                'Option2 Name': 'Size',
-                'Option2 Value': row['Option2 Value'],
-                'Variant Inventory Adjust': 0
-            }
-            writer.writerow(output_row)
+            writer.writerow(removal_row(row))
 
 def write_new_sizes_csv(filename, rows):
     """
     Write rows to new sizes CSV with the exact required format.
     """
-    fieldnames = [
-        'Handle', 'Vendor', 'Type',
-        'Command', 'Published', 'Option1 Name', 'Option1 Value',
-        'Option2 Name', 'Option2 Value', 'Variant Inventory Tracker',
-        'Variant Inventory Qty', 'Variant Inventory Policy',
-        'Variant Fulfillment Service', 'Variant Price', 'Variant Compare At Price',
-        'Variant Requires Shipping', 'Variant Image', 'Status'
-    ]
-    
     with open(filename, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=NEW_SIZES_FIELDNAMES)
         writer.writeheader()
         
         for row in rows:
-            output_row = {
-                'Handle': row['Handle'].zfill(8),  # Ensure 8 digits
-                'Vendor': 'Zara',
-                'Type': row.get('Type', ''),  # Get from original row if available
-                'Command': 'MERGE',
-                'Published': 'TRUE',
-                'Option1 Name': 'Color',
-                'Option1 Value': row['Option1 Value'],
-                'Option2 Name': 'Size',
-                'Option2 Value': row['Option2 Value'],
-                'Variant Inventory Tracker': 'shopify',
-                'Variant Inventory Qty': 1000,
-                'Variant Inventory Policy': 'deny',
-                'Variant Fulfillment Service': 'manual',
-                'Variant Price': row['Variant Price'],
-                'Variant Compare At Price': row['Variant Compare At Price'],
-                'Variant Requires Shipping': 'TRUE',
-                'Variant Image': row.get('Variant Image', ''),
-                'Status': 'active'
-            }
-            writer.writerow(output_row)
+            writer.writerow(new_size_row(row))
 
 def write_csv(filename, rows):
     """Helper function to write rows to CSV file."""
@@ -222,9 +198,176 @@ def write_csv(filename, rows):
         writer.writeheader()
         writer.writerows(rows)
 
+# Handles whose store-stock lookups may be in flight at once; memory is bounded by this window
+MAX_IN_FLIGHT_HANDLES = 16
+
+def iter_handle_groups(master_file):
+    """
+    Stream master_merge.csv one handle at a time.
+
+    Rows of a handle are contiguous in the master file (create_csv writes them
+    that way), so only the current group is held in memory.
+
+    Yields:
+    - tuple: (handle, list of rows)
+    """
+    with open(master_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        handle = None
+        rows = []
+        for row in reader:
+            if rows and row['Handle'] != handle:
+                yield handle, rows
+                rows = []
+            handle = row['Handle']
+            rows.append(row)
+        if rows:
+            yield handle, rows
+
+def diff_handle(handle, rows, gender="WOMAN", probe=PROBE_NEW_SIZES):
+    """
+    Compare one handle's master rows with live store stock.
+
+    Returns:
+    - tuple: (removed rows, new-size rows) for this handle.
+    """
+    sizes_by_color = {}
+    color_code_by_color = {}
+    rows_by_key = {}
+    for row in rows:
+        color = row['Option1 Value']
+        size = row['Option2 Value']
+        sizes_by_color.setdefault(color, set()).add(size)
+        color_code_by_color.setdefault(color, row['color_code'])
+        rows_by_key[f"{handle}_{color}_{size}"] = row
+
+    sku_base = handle.zfill(8)  # Pad with zeros to match Zara's format
+
+    # Fetch current inventory, asking for the sizes each color is known in (and its neighbours when probing)
+    inventory_data = fetch_inventory(sku_base, build_size_catalog(rows), gender, probe)
+
+    # Process inventory data
+    current_sizes_by_color = {}
+    for reference, size in select_available(sizes_by_store(inventory_data)).items():
+        color_code = reference[-11:-8]
+        current_sizes_by_color.setdefault(color_code, set()).add(size)
+
+    removed_items = []
+    new_items = []
+    # Compare with existing data and identify changes
+    for color, existing_sizes in sizes_by_color.items():
+        current_sizes = current_sizes_by_color.get(color_code_by_color[color], set())
+
+        # Find removed sizes
+        for size in existing_sizes - current_sizes:
+            row = rows_by_key.get(f"{handle}_{color}_{size}")
+            if row:
+                row = row.copy()
+                row['Variant Inventory Adjust'] = 0
+                removed_items.append(row)
+
+        # Find new sizes
+        for size in current_sizes - existing_sizes:
+            # Create new row based on existing color variant
+            base_row = rows_by_key.get(f"{handle}_{color}_{next(iter(existing_sizes))}")  # Any existing size as template
+            if base_row:
+                new_row = base_row.copy()
+                new_row['Option2 Value'] = size
+                new_row['Variant Inventory Qty'] = 1000
+                new_row['Command'] = 'MERGE'
+                new_items.append(new_row)
+    return removed_items, new_items
+
+class LazyCsvWriter:
+    """DictWriter that only creates its file once the first row arrives."""
+
+    def __init__(self, filename, fieldnames, format_row):
+        self.filename = filename
+        self.fieldnames = fieldnames
+        self.format_row = format_row
+        self.file = None
+        self.writer = None
+        self.rows = 0
+
+    def writerows(self, rows):
+        for row in rows:
+            if self.writer is None:
+                self.file = open(self.filename, 'w', encoding='utf-8', newline='')
+                self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+                self.writer.writeheader()
+            self.writer.writerow(self.format_row(row))
+            self.rows += 1
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def process_inventory_changes(master_file, output_removal_file, output_new_file, max_in_flight=MAX_IN_FLIGHT_HANDLES, catalog=None,
+                              probe=PROBE_NEW_SIZES):
+    """
+    Process inventory changes using the combined master file.
+
+    Handles are read one group at a time and checked concurrently, at most
+    max_in_flight at once. Removal and new-size rows are written as soon as
+    each handle completes.
+    
+    Args:
+        master_file: Path to our combined CSV file
+        output_removal_file: Path to save items that are no longer in stock
+        output_new_file: Path to save newly available items
+        max_in_flight: Handles being fetched at the same time
+        catalog: Optional CatalogIndex of scraped products, used for each
+            handle's store-stock section (gender); WOMAN when unknown
+        probe: Also query sizes next to the known ones; new sizes are only
+            found (and output_new_file only written) in probe mode
+    """
+    removals = LazyCsvWriter(output_removal_file, REMOVAL_FIELDNAMES, removal_row)
+    additions = LazyCsvWriter(output_new_file, NEW_SIZES_FIELDNAMES, new_size_row)
+    started = time.monotonic()
+    handles = 0
+
+    def write_done(done):
+        for future in done:
+            handle = in_flight.pop(future)
+            try:
+                removed_items, new_items = future.result()
+            except Exception as e:
+                logging.info(f"[ERROR] Inventory refresh failed for {handle}: {e}")
+                continue
+            removals.writerows(removed_items)
+            additions.writerows(new_items)
+
+    in_flight = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="inventory-handle") as executor:
+            for handle, rows in iter_handle_groups(master_file):
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    write_done(done)
+                gender = (catalog.gender(handle) if catalog else None) or "WOMAN"
+                in_flight[executor.submit(diff_handle, handle, rows, gender, probe)] = handle
+                handles += 1
+            write_done(list(in_flight))
+    finally:
+        removals.close()
+        additions.close()
+    logging.info(f"Refreshed {handles} handles in {time.monotonic() - started:.1f}s: "
+                 f"{removals.rows} removed, {additions.rows} new sizes")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff master_merge.csv against live store stock.")
+    parser.add_argument("--probe-new-sizes", action="store_true",
+                        help="also query sizes next to the known ones, so new sizes are detected (use for scheduled refreshes)")
+    args = parser.parse_args()
+
     master_file = "master_merge.csv"  # Our new combined file
     output_removal_file = "random_tests/removal.csv"
     output_new_file = "random_tests/new_upload.csv"
     
-    process_inventory_changes(master_file, output_removal_file, output_new_file)
\ No newline at end of file
+    # The SQLite catalog when it has been built, the JSON snapshot otherwise
+    catalog = CatalogStore() if os.path.exists(CATALOG_DB) else load_catalog("scrapes/master.json")
+    process_inventory_changes(master_file, output_removal_file, output_new_file, catalog=catalog,
+                              probe=args.probe_new_sizes)
+    suffix_resolver.save()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from queue import Queue
+
+_DONE = object()
+
+class Pipeline:
+    """
+    Producer/consumer crawl pipeline with bounded queues between stages.
+
+    Producers call submit() from any thread; it blocks while `queue_size`
+    tasks are already waiting, which throttles discovery to the pace of the
+    workers. `workers` threads run worker(task) and put every result it
+    returns on a second bounded queue, drained in order by a single writer
+    thread that calls sink(result). A slow sink therefore backs up the
+    workers, and the workers back up discovery.
+    """
+
+    def __init__(self, worker, sink, workers=16, queue_size=256):
+        self.worker = worker
+        self.sink = sink
+        self.tasks = Queue(maxsize=queue_size)
+        self.results = Queue(maxsize=queue_size)
+        self.worker_threads = [
+            threading.Thread(target=self._work, name=f"pipeline-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self.writer_thread = threading.Thread(target=self._write, name="pipeline-writer", daemon=True)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.written = 0
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+        for thread in self.worker_threads:
+            thread.start()
+        self.writer_thread.start()
+        return self
+
+    def submit(self, task):
+        """Queue a task, blocking while the task queue is full."""
+        with self.lock:
+            self.submitted += 1
+        self.tasks.put(task)
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is _DONE:
+                return
+            try:
+                for result in self.worker(task) or ():
+                    self.results.put(result)
+            except Exception as e:
+                logging.info(f"[ERROR] Pipeline task {task!r} failed: {e}")
+            with self.lock:
+                self.completed += 1
+
+    def _write(self):
+        while True:
+            result = self.results.get()
+            if result is _DONE:
+                return
+            try:
+                self.sink(result)
+                self.written += 1
+            except Exception as e:
+                logging.info(f"[ERROR] Pipeline sink failed: {e}")
+
+    def close(self):
+        """Wait for every submitted task to be processed and written."""
+        for _ in self.worker_threads:
+            self.tasks.put(_DONE)
+        for thread in self.worker_threads:
+            thread.join()
+        self.results.put(_DONE)
+        self.writer_thread.join()
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        logging.info(f"Pipeline done: {self.completed}/{self.submitted} tasks, {self.written} results written in {elapsed:.1f}s")
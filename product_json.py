@@ -0,0 +1,104 @@
+import logging
+import re
+
+import orjson
+
+from imports_common import extract_size
+from season_suffix import season_of
+
+# Product pages ship their render state as `window.zara.viewPayload = {...};`
+PAYLOAD_MARKER = b"window.zara.viewPayload"
+IMAGE_WIDTH = "2048"
+
+def find_payload(raw_content):
+    """
+    Locate and parse the embedded state blob with a plain byte search.
+
+    Returns:
+    - dict | None: The decoded payload, or None when the page has none.
+    """
+    idx = raw_content.find(PAYLOAD_MARKER)
+    if idx == -1:
+        return None
+    start = raw_content.find(b"{", idx)
+    end = raw_content.find(b"</script>", start)
+    if start == -1 or end == -1:
+        return None
+    blob = raw_content[start:end].rstrip().rstrip(b";")
+    try:
+        return orjson.loads(blob)
+    except orjson.JSONDecodeError as e:
+        logging.info(f"[ERROR] Embedded product payload did not parse: {e}")
+        return None
+
+def format_price(amount):
+    """Render a price in minor units the way the page shows it, e.g. 355000 -> '3,550.00'."""
+    return f"{amount / 100:,.2f}"
+
+def image_url(media):
+    url = media.get("url")
+    if url:
+        return url.replace("{width}", IMAGE_WIDTH)
+    return f"https://static.zara.net/photos///{media['path']}/w/{IMAGE_WIDTH}/{media['name']}.jpg?ts={media.get('timestamp', '')}"
+
+def pick_color(colors, url):
+    """Choose the color the product URL points at (v1 is the color's productId)."""
+    v1 = re.search(r"[?&]v1=(\d+)", url)
+    if v1:
+        for color in colors:
+            if str(color.get("productId")) == v1.group(1):
+                return color
+    return colors[0]
+
+def extract_product_fields(raw_content, url):
+    """
+    Build the same field dict as the selector-based parse_product_page from
+    the embedded product JSON.
+
+    Returns:
+    - dict | None: The product fields, or None when the payload is missing or
+      does not have the expected shape (callers then fall back to selectors).
+    """
+    payload = find_payload(raw_content)
+    if not payload:
+        return None
+    try:
+        product = payload["product"]
+        detail = product["detail"]
+        color = pick_color(detail["colors"], url)
+
+        color_code = str(color["id"]).zfill(3)[-3:]
+        display_reference = color.get("displayReference") or detail.get("displayReference", "")
+        reference_pre = "0" + display_reference.replace("/", "")
+        if not display_reference or not reference_pre.endswith(color_code):
+            sku_id = re.search(r'p(\d+)\.html', url).group(1)
+            reference_pre = sku_id + color_code
+
+        price = format_price(color["price"])
+        old_price = color.get("oldPrice")
+        original_price = format_price(old_price) if old_price else price
+
+        # Size references carry the store-stock season suffix, e.g. '0306721080001-V2025'
+        seasons = (season_of(size.get("reference")) for size in color.get("sizes", []))
+        season = next((s for s in seasons if s), None)
+
+        image_urls = ""
+        for media in color.get("xmedia", []):
+            if media.get("type", "image") != "image":
+                continue
+            image_urls += image_url(media) + ","
+
+        return {
+            "name": product["name"],
+            "price": price,
+            "original_price": original_price,
+            "color": color["name"].strip(),
+            "color_code": color_code,
+            "reference_pre": reference_pre,
+            "sizes_num": [extract_size(size["name"]) for size in color.get("sizes", [])],
+            "image_urls": image_urls,
+            "season": season,
+        }
+    except (KeyError, IndexError, TypeError, AttributeError) as e:
+        logging.info(f"[DEBUG] Embedded product payload missing fields ({e}), using selectors for {url}")
+        return None
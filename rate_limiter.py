@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+import time
+
+# Starting pace per endpoint. Rates are requests/sec; the limiter climbs towards
+# max_rate while responses are clean and halves on 429/403.
+LIMITS = {
+    "product_page": {"rate": 4.0, "min_rate": 0.5, "max_rate": 20.0, "burst": 8},
+    "store_stock": {"rate": 2.0, "min_rate": 0.2, "max_rate": 10.0, "burst": 4},
+}
+
+BLOCK_STATUSES = (403, 429)
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts with AIMD (additive increase,
+    multiplicative decrease).
+
+    Every `window` clean responses the rate grows by `increase`; a 429/403 cuts
+    it by `decrease` and pauses the bucket for an exponentially growing
+    cool-down. Blocks reported during that cool-down come from requests
+    already in flight and do not cut again. A single instance is safe to
+    share between threads (acquire) and coroutines (acquire_async).
+    """
+
+    def __init__(self, name, rate, min_rate, max_rate, burst=1, increase=0.5, decrease=0.5,
+                 window=20, base_pause=1.0, max_pause=120.0):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.base_pause = base_pause
+        self.max_pause = max_pause
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.clean_streak = 0
+        self.block_streak = 0
+
+    def _reserve(self):
+        """Take a token if one is available, else return how long to wait."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.last_refill) * self.rate)
+            self.last_refill = max(now, self.last_refill)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block the calling thread until a request may be sent."""
+        while True:
+            delay = self._reserve()
+            if not delay:
+                return
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Suspend the calling coroutine until a request may be sent."""
+        while True:
+            delay = self._reserve()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def report(self, status):
+        """
+        Feed a response status back into the limiter.
+
+        Args:
+        - status (int | None): HTTP status code, or None for a network error.
+          Network errors and non-blocking failures leave the rate unchanged.
+        """
+        with self.lock:
+            if status in BLOCK_STATUSES:
+                self.clean_streak = 0
+                if time.monotonic() < self.blocked_until:
+                    # Sent before the last cut took effect; one congestion event, one cut
+                    return
+                self.block_streak += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                pause = min(self.max_pause, self.base_pause * 2 ** (self.block_streak - 1))
+                self.blocked_until = time.monotonic() + pause
+                self.tokens = 0.0
+                self.last_refill = self.blocked_until
+                logging.info(f"[RATE] {self.name}: HTTP {status}, rate cut to {self.rate:.2f}/s, pausing {pause:.0f}s")
+            elif status is not None and status < 400:
+                self.block_streak = 0
+                self.clean_streak += 1
+                if self.clean_streak >= self.window:
+                    self.clean_streak = 0
+                    if self.rate < self.max_rate:
+                        self.rate = min(self.max_rate, self.rate + self.increase)
+                        logging.debug(f"[RATE] {self.name}: rate raised to {self.rate:.2f}/s")
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name):
+    """Return the process-wide limiter for an endpoint, creating it on first use."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveRateLimiter(name, **LIMITS[name])
+        return _limiters[name]
+
+def scale_limits(share):
+    """
+    Give this process `share` of every endpoint's rates, for when several
+    processes crawl the same site (see sharded_crawl). Applies to limiters
+    already created and to those created later.
+    """
+    with _limiters_lock:
+        for name, limits in LIMITS.items():
+            for key in ("rate", "min_rate", "max_rate"):
+                limits[key] *= share
+            limits["burst"] = max(1, int(limits["burst"] * share))
+            limiter = _limiters.get(name)
+            if limiter:
+                with limiter.lock:
+                    limiter.rate = limits["rate"]
+                    limiter.min_rate = limits["min_rate"]
+                    limiter.max_rate = limits["max_rate"]
+                    limiter.burst = limits["burst"]
+                    limiter.tokens = min(limiter.tokens, limiter.burst)
@@ -0,0 +1,170 @@
+import logging
+import os
+import re
+import threading
+import time
+
+import orjson
+
+SUFFIX_FILE = "cache/season_suffixes.json"
+# Seeds for a fresh state file; later seasons are learned as they show up
+DEFAULT_SEASONS = ["I2024", "V2025"]
+# A known family whose suffix answers empty probes the other suffixes at most this often
+REPROBE_AGE = 7 * 24 * 3600
+# References end in a season code: V (spring/summer) or I (autumn/winter) plus the year
+SEASON_PATTERN = re.compile(r"-([VI]\d{4})$")
+
+def season_of(reference):
+    """'0306721080001-V2025' -> 'V2025', or None when there is no season code."""
+    match = SEASON_PATTERN.search(reference or "")
+    return match.group(1) if match else None
+
+def season_order(season):
+    """Sort key: V2025 comes before I2025, which comes before V2026."""
+    return (int(season[1:]), 0 if season[0] == "V" else 1)
+
+def next_season(season):
+    year = int(season[1:])
+    return f"I{year}" if season[0] == "V" else f"V{year + 1}"
+
+def family_of(reference):
+    """The zero-padded 8 digit sku that starts every reference of a product."""
+    return reference[:8]
+
+def has_stock(data):
+    """True when a store-stock response lists at least one available product."""
+    return any(store.get("availableProducts") for store in data.get("productAvailability", []))
+
+def only_season(data, season):
+    """Cut a store-stock response down to the references of one season."""
+    stores = []
+    for store in data.get("productAvailability", []):
+        available = [product for product in store.get("availableProducts", [])
+                     if season_of(product.get("reference")) == season]
+        if available:
+            stores.append({**store, "availableProducts": available})
+    return {"productAvailability": stores}
+
+class SuffixResolver:
+    """
+    Learns which season suffix each sku family's store-stock references use.
+
+    A family maps to the suffix seen in its product payload or in a store-stock
+    response, and that suffix is requested on its own. Unknown families probe
+    every candidate suffix in one request: the seasons seen so far, most
+    common first, followed by the season after the newest one so a new
+    collection is found without a code change. A known family whose suffix
+    comes back empty may have moved to a new season code, so it probes the
+    other candidates the same way, at most once per reprobe_age. When
+    several suffixes have stock, the first candidate wins. The mapping is
+    persisted between runs.
+    """
+
+    def __init__(self, path=SUFFIX_FILE, seasons=DEFAULT_SEASONS, reprobe_age=REPROBE_AGE):
+        self.path = path
+        self.reprobe_age = reprobe_age
+        self.lock = threading.Lock()
+        self.families = {}
+        # family -> when its known suffix last came back empty and was re-probed
+        self.reprobed = {}
+        self.seasons = {season: 0 for season in seasons}
+        self.lookups = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                state = orjson.loads(f.read())
+            self.families.update(state.get("families", {}))
+            self.reprobed.update(state.get("reprobed", {}))
+            for season, count in state.get("seasons", {}).items():
+                self.seasons[season] = max(self.seasons.get(season, 0), count)
+            logging.info(f"Loaded season suffixes for {len(self.families)} sku families from {path}")
+
+    def learn(self, reference, season):
+        """Record that the family of `reference` uses `season`."""
+        if not season:
+            return
+        family = family_of(reference)
+        with self.lock:
+            if self.families.get(family) != season:
+                self.families[family] = season
+                self.seasons[season] = self.seasons.get(season, 0) + 1
+
+    def known(self, reference):
+        with self.lock:
+            return self.families.get(family_of(reference))
+
+    def candidates(self):
+        with self.lock:
+            seasons = sorted(self.seasons, key=lambda s: (-self.seasons[s], [-part for part in season_order(s)]))
+        newest = max(seasons, key=season_order)
+        return seasons + [next_season(newest)]
+
+    def resolve(self, reference, lookup):
+        """
+        Run a store-stock lookup with the right season suffix.
+
+        Args:
+        - reference: Any reference (or prefix) of the product, used for its family.
+        - lookup: Callable taking a list of suffixes such as ['V2025'] and
+          returning one store-stock response covering all of them.
+
+        Returns:
+        - tuple: (suffix or None, response for that suffix only). The suffix
+          is None when no candidate had stock.
+        """
+        family = family_of(reference)
+        season = self.known(reference)
+        candidates = self.candidates()
+        if season:
+            data = lookup([season])
+            with self.lock:
+                self.lookups += 1
+            if has_stock(data):
+                return season, only_season(data, season)
+            with self.lock:
+                if time.time() - self.reprobed.get(family, 0) < self.reprobe_age:
+                    return None, {"productAvailability": []}
+                self.reprobed[family] = time.time()
+            candidates = [candidate for candidate in candidates if candidate != season]
+
+        data = lookup(candidates)
+        with self.lock:
+            self.lookups += 1
+        for candidate in candidates:
+            found = only_season(data, candidate)
+            if has_stock(found):
+                self.learn(reference, candidate)
+                return candidate, found
+        return None, {"productAvailability": []}
+
+    def save(self):
+        """Write the mapping, merged with whatever other processes saved meanwhile."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = {"families": {}, "seasons": {}}
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                state = orjson.loads(f.read())
+        with self.lock:
+            state["families"].update(self.families)
+            reprobed = state.setdefault("reprobed", {})
+            for family, probed_at in self.reprobed.items():
+                reprobed[family] = max(reprobed.get(family, 0), probed_at)
+            for season, count in self.seasons.items():
+                state["seasons"][season] = max(state["seasons"].get(season, 0), count)
+            data = orjson.dumps(state)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Saved season suffixes for {len(state['families'])} sku families "
+                     f"({self.lookups} store-stock lookups this run)")
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_resolver():
+    """Return the process-wide resolver, loading the saved mapping on first use."""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = SuffixResolver()
+        return _resolver
@@ -0,0 +1,134 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import orjson
+
+import rate_limiter
+from category_client import load_category_rows
+from crawl_output import compact_jsonl
+from crawl_state import CrawlState
+from http_cache import PageCache
+
+def shard_rows(rows, shards):
+    """Deal category rows round-robin so every shard gets a mix of large and small categories."""
+    return [rows[i::shards] for i in range(shards)]
+
+def run_shard(shard_id, rows, shard_dir, master_file, shards, resume=False):
+    """
+    Crawl one shard in its own process, streaming its results as JSONL.
+
+    Each process imports the scraper fresh, so it gets its own fetch engine,
+    browser pool, page cache and crawl state copy. Its rate limiters get
+    1/shards of the configured rates, so all shards together stay within
+    rate_limiter.LIMITS.
+    """
+    rate_limiter.scale_limits(1 / shards)
+    import zara_scraper_parallel as crawler
+
+    crawler.page_cache.path = os.path.join(shard_dir, f"page_cache_{shard_id}.json")
+    crawler.crawl_state.path = os.path.join(shard_dir, f"crawl_state_{shard_id}.json")
+    crawler.stream_file = os.path.join(shard_dir, f"shard_{shard_id}.jsonl")
+    crawler.checkpoint_file = os.path.join(shard_dir, f"checkpoint_{shard_id}.json")
+    if master_file:
+        crawler.get_unique_handles_fast(master_file)
+    crawler.crawl(rows, resume=resume)
+    # Save state before reporting; the atexit handler's close_clients() is then a no-op
+    crawler.close_clients()
+    logging.info(f"Shard {shard_id}: {len(rows)} categories, {crawler.stream_writer.written} entries -> {crawler.stream_file}")
+
+def merge_shards(shard_dir, shards, output_file):
+    """
+    Combine shard outputs into one All.json, identical to a single-process crawl.
+
+    Returns:
+    - bool: False, leaving output_file untouched, when a shard's output is missing.
+    """
+    shard_files = []
+    for shard_id in range(shards):
+        shard_file = os.path.join(shard_dir, f"shard_{shard_id}.jsonl")
+        if not os.path.exists(shard_file):
+            logging.info(f"[ERROR] Missing output for shard {shard_id}, not writing {output_file}")
+            return False
+        shard_files.append(shard_file)
+    compact_jsonl(shard_files, output_file)
+    return True
+
+def merge_page_caches(shard_dir, shards):
+    """
+    Fold the per-shard page caches back into the shared cache file.
+
+    Every shard saves the whole cache it started from, so a page is taken
+    from whichever copy checked it last rather than from the last shard.
+    """
+    cache = PageCache()
+    for shard_id in range(shards):
+        path = os.path.join(shard_dir, f"page_cache_{shard_id}.json")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                cache.merge(orjson.loads(f.read()))
+            os.remove(path)
+    cache.save()
+
+def merge_crawl_states(shard_dir, shards):
+    """Fold the per-shard crawl states back into the shared state file, newest crawl of each product first."""
+    state = CrawlState()
+    for shard_id in range(shards):
+        path = os.path.join(shard_dir, f"crawl_state_{shard_id}.json")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                state.merge(orjson.loads(f.read()))
+            os.remove(path)
+    state.save()
+
+def main():
+    # Only the parent logs here; spawned shards re-import this module, and
+    # zara_scraper_parallel gives each of them its own log file and stdout handler
+    logging.basicConfig(format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
+                        datefmt='%H:%M:%S',
+                        level=logging.INFO,
+                        stream=sys.stdout)
+    parser = argparse.ArgumentParser(description="Crawl categories CSV rows across several processes.")
+    parser.add_argument("categories", nargs="+", help="categories CSV files, e.g. csv/categories.csv csv/categories_woman.csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="number of crawler processes")
+    parser.add_argument("--output", default="All.json")
+    parser.add_argument("--shard-dir", default="shards")
+    parser.add_argument("--master", default=None, help="skip products already in this master CSV (e.g. master_merge.csv)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted crawl; needs the same categories, --workers and --shard-dir")
+    args = parser.parse_args()
+
+    rows = load_category_rows(args.categories)
+    shards = max(1, min(args.workers, len(rows)))
+    os.makedirs(args.shard_dir, exist_ok=True)
+    started = time.monotonic()
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for shard_id, shard in enumerate(shard_rows(rows, shards)):
+        process = context.Process(target=run_shard, args=(shard_id, shard, args.shard_dir, args.master, shards, args.resume), name=f"shard-{shard_id}")
+        process.start()
+        processes.append(process)
+    failed = []
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logging.info(f"[ERROR] {process.name} exited with code {process.exitcode}")
+            failed.append(process.name)
+
+    # What the shards learned is kept either way, the output only when all of them finished
+    merge_page_caches(args.shard_dir, shards)
+    merge_crawl_states(args.shard_dir, shards)
+    if failed:
+        logging.info(f"[ERROR] {len(failed)} of {shards} shards failed, not writing {args.output}; "
+                     f"rerun with --resume to finish them")
+        sys.exit(1)
+    if not merge_shards(args.shard_dir, shards, args.output):
+        sys.exit(1)
+    logging.info(f"Crawled {len(rows)} categories with {shards} processes in {time.monotonic() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
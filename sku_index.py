@@ -0,0 +1,127 @@
+import csv
+import hashlib
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+SKU_INDEX_FILE = "cache/known_skus.bin"
+BITS_PER_KEY = 10
+HASHES = 7
+
+def sku_number(sku_id):
+    """'05070660' and '5070660' (a Shopify Handle) are the same sku, stored as 5070660."""
+    return int(str(sku_id).strip())
+
+class BloomFilter:
+    """Fixed-size Bloom filter over sku numbers; about 1% false positives at BITS_PER_KEY."""
+
+    def __init__(self, capacity, bits_per_key=BITS_PER_KEY, hashes=HASHES):
+        self.size = max(1024, capacity * bits_per_key)
+        self.hashes = hashes
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, number):
+        digest = hashlib.blake2b(number.to_bytes(8, "little"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, number):
+        for position in self._positions(number):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, number):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(number))
+
+class KnownSkuIndex:
+    """
+    Skus already uploaded to Shopify, for skipping known products during
+    discovery.
+
+    On disk the index is a sorted array of uint32 sku numbers. In memory that
+    array sits behind a Bloom filter, so most unknown skus are rejected
+    without touching it. Skus added during a run go to a small set until
+    save() merges them into the array. Lookups and updates are thread-safe.
+    """
+
+    def __init__(self, path=SKU_INDEX_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.skus = array("I")
+        self.added = set()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.skus.frombytes(f.read())
+            logging.info(f"Loaded {len(self.skus)} known skus from {path}")
+        self._rebuild_filter()
+
+    def _rebuild_filter(self):
+        self.filter = BloomFilter(len(self.skus) + len(self.added) + 1024)
+        for number in self.skus:
+            self.filter.add(number)
+        for number in self.added:
+            self.filter.add(number)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.skus) + len(self.added)
+
+    def __contains__(self, sku_id):
+        number = sku_number(sku_id)
+        with self.lock:
+            if number not in self.filter:
+                return False
+            if number in self.added:
+                return True
+            i = bisect_left(self.skus, number)
+            return i < len(self.skus) and self.skus[i] == number
+
+    def add(self, sku_id):
+        number = sku_number(sku_id)
+        with self.lock:
+            if number in self.added:
+                return
+            i = bisect_left(self.skus, number)
+            if i < len(self.skus) and self.skus[i] == number:
+                return
+            self.added.add(number)
+            self.filter.add(number)
+
+    def update_from_csv(self, csv_file, column="Handle", replace=False):
+        """
+        Add every sku of a master CSV (e.g. master_merge.csv), streaming it
+        with the csv module. With replace, skus missing from the CSV are
+        dropped, so the index mirrors it exactly.
+        """
+        if replace:
+            with self.lock:
+                self.skus = array("I")
+                self.added = set()
+                self._rebuild_filter()
+        count = 0
+        with open(csv_file, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row.get(column):
+                    self.add(row[column])
+                    count += 1
+        logging.info(f"Indexed {count} rows from {csv_file}: {len(self)} known skus")
+
+    def is_stale(self, csv_file):
+        """True when csv_file changed after the index was last saved."""
+        return not os.path.exists(self.path) or os.path.getmtime(csv_file) > os.path.getmtime(self.path)
+
+    def save(self):
+        with self.lock:
+            if self.added:
+                self.skus = array("I", sorted(set(self.skus).union(self.added)))
+                self.added = set()
+                self._rebuild_filter()
+            data = self.skus.tobytes()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Saved {len(self.skus)} known skus to {self.path}")
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from rate_limiter import get_limiter
+
+STORE_STOCK_URL = "https://www.zara.com/in/en/store-stock"
+# Stores to check, first one is the primary store, e.g. ZARA_STORE_IDS=16156,9217,16157,9218.
+# All of them are requested in the same call.
+STORE_IDS = [int(store_id) for store_id in os.environ.get("ZARA_STORE_IDS", "16156").split(",") if store_id.strip()]
+# Which stores a size must be stocked in to count as available: any, all or primary
+STORE_POLICIES = ("any", "all", "primary")
+STORE_POLICY = os.environ.get("ZARA_STORE_POLICY", "any")
+# Conservative bound that the site and proxies in between accept
+MAX_URL_LENGTH = 4000
+
+HEADERS = {
+    "accept": "application/json",
+    "accept-encoding": "gzip, deflate, br, zstd",
+    "accept-language": "en-US,en;q=0.9",
+    "cache-control": "no-cache",
+    "content-type": "application/json",
+    "sec-ch-ua": '"Chromium";v="130", "Google Chrome";v="130", "Not?A_Brand";v="99"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-site": "same-origin",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
+}
+
+limiter = get_limiter("store_stock")
+
+def build_url(references, gender, store_ids=STORE_IDS):
+    """Build a store-stock URL for full references such as '0306721080001-V2025'."""
+    url = STORE_STOCK_URL + "?"
+    for store_id in store_ids:
+        url += f"physicalStoreIds={store_id}&"
+    for ref in references:
+        url += f"references={ref}&"
+    url += f"sectionName={gender.upper()}&ajax=true"
+    return url
+
+def fetch_store_stock(references, gender, store_ids=STORE_IDS):
+    """
+    One paced store-stock request.
+
+    Returns:
+    - dict: The decoded response; {"productAvailability": []} on any error.
+    """
+    url = build_url(references, gender, store_ids)
+    try:
+        limiter.acquire()
+        response = requests.get(url, headers=HEADERS, timeout=15)
+        limiter.report(response.status_code)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        logging.info(f"Error fetching store availability for: {e}")
+        return {"productAvailability": []}
+
+def chunk_references(references, gender, store_ids=STORE_IDS, max_url_length=MAX_URL_LENGTH):
+    """Split references into runs whose store-stock URL stays within max_url_length."""
+    chunks = []
+    chunk = []
+    for ref in references:
+        if chunk and len(build_url(chunk + [ref], gender, store_ids)) > max_url_length:
+            chunks.append(chunk)
+            chunk = []
+        chunk.append(ref)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def merge_responses(responses):
+    """Combine store-stock responses for disjoint references into one, store by store."""
+    stores = {}
+    for data in responses:
+        for store in data.get("productAvailability", []):
+            merged = stores.setdefault(store.get("physicalStoreId"), {**store, "availableProducts": []})
+            merged["availableProducts"].extend(store.get("availableProducts", []))
+    return {"productAvailability": list(stores.values())}
+
+def route_availability(data, references):
+    """
+    Cut a batched response down to the entries for one caller's references.
+
+    Returns:
+    - dict: Same shape as a store-stock response, keeping only stores with at
+      least one of `references` available.
+    """
+    stores = []
+    for store in data.get("productAvailability", []):
+        available = [product for product in store.get("availableProducts", []) if product.get("reference") in references]
+        if available:
+            stores.append({**store, "availableProducts": available})
+    return {"productAvailability": stores}
+
+def sizes_by_store(data):
+    """
+    Per-store availability from a store-stock response.
+
+    Returns:
+    - dict: store id -> {reference: size}, in response order.
+    """
+    stores = {}
+    for store in data.get("productAvailability", []):
+        available = stores.setdefault(store.get("physicalStoreId"), {})
+        for product in store.get("availableProducts", []):
+            available[product.get("reference")] = product.get("size")
+    return stores
+
+def select_available(stores, policy=STORE_POLICY, store_ids=STORE_IDS):
+    """
+    Apply a store policy to the output of sizes_by_store().
+
+    Returns:
+    - dict: {reference: size} that counts as available under `policy`:
+      stocked in any store, in every one of `store_ids`, or in the primary
+      (first) store.
+    """
+    if policy not in STORE_POLICIES:
+        raise ValueError(f"Unknown store policy {policy!r}, expected one of {STORE_POLICIES}")
+    if policy == "primary":
+        return dict(stores.get(store_ids[0], {}))
+    selected = {}
+    for available in stores.values():
+        for reference, size in available.items():
+            selected.setdefault(reference, size)
+    if policy == "all":
+        selected = {
+            reference: size for reference, size in selected.items()
+            if all(reference in stores.get(store_id, {}) for store_id in store_ids)
+        }
+    return selected
+
+def apply_policy(data, policy=STORE_POLICY, store_ids=STORE_IDS):
+    """
+    Collapse a multi-store response into one store entry holding what is
+    available under `policy`, for callers that read productAvailability as
+    a single store.
+    """
+    available = select_available(sizes_by_store(data), policy, store_ids)
+    if not available:
+        return {"productAvailability": []}
+    products = [{"reference": reference, "size": size} for reference, size in available.items()]
+    return {"productAvailability": [{"physicalStoreId": store_ids[0], "availableProducts": products}]}
+
+class StockBatcher:
+    """
+    Packs store-stock lookups from many products into shared requests.
+
+    submit() returns a Future immediately. References wait per section
+    (gender) until the URL would exceed max_url_length or the oldest waiting
+    lookup is flush_interval seconds old. Then one request is sent and each
+    Future receives just the availability for its own references. A single
+    product's references are never split across requests.
+    """
+
+    def __init__(self, store_ids=STORE_IDS, max_url_length=MAX_URL_LENGTH, flush_interval=0.25, max_in_flight=4):
+        self.store_ids = store_ids
+        self.max_url_length = max_url_length
+        self.flush_interval = flush_interval
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="stock-batch")
+        self.timer = None
+        self.requests_sent = 0
+        self.lookups = 0
+
+    def _url_length(self, gender, references):
+        return len(build_url(references, gender, self.store_ids))
+
+    def submit(self, references, gender):
+        future = Future()
+        references = list(references)
+        if not references:
+            future.set_result({"productAvailability": []})
+            return future
+        with self.cond:
+            self.lookups += 1
+            if self.timer is None:
+                self.timer = threading.Thread(target=self._run_timer, name="stock-batch-timer", daemon=True)
+                self.timer.start()
+            batch = self.pending.get(gender)
+            if batch and self._url_length(gender, batch["references"] + references) > self.max_url_length:
+                self._flush(gender)
+                batch = None
+            if batch is None:
+                batch = self.pending[gender] = {"started": time.monotonic(), "references": [], "waiters": []}
+                self.cond.notify()
+            batch["references"].extend(references)
+            batch["waiters"].append((set(references), future))
+            if self._url_length(gender, batch["references"]) >= self.max_url_length:
+                self._flush(gender)
+        return future
+
+    def lookup(self, references, gender):
+        """Blocking helper around submit()."""
+        return self.submit(references, gender).result()
+
+    def _flush(self, gender):
+        # Caller holds self.cond
+        batch = self.pending.pop(gender)
+        self.requests_sent += 1
+        self.executor.submit(self._send, gender, batch)
+
+    def _send(self, gender, batch):
+        data = fetch_store_stock(batch["references"], gender, self.store_ids)
+        for references, future in batch["waiters"]:
+            future.set_result(route_availability(data, references))
+
+    def _run_timer(self):
+        with self.cond:
+            while True:
+                if not self.pending:
+                    self.cond.wait()
+                    continue
+                now = time.monotonic()
+                for gender in [g for g, batch in self.pending.items() if now - batch["started"] >= self.flush_interval]:
+                    self._flush(gender)
+                if self.pending:
+                    oldest = min(batch["started"] for batch in self.pending.values())
+                    self.cond.wait(max(0.0, oldest + self.flush_interval - now))
+
+    def flush_all(self):
+        with self.cond:
+            for gender in list(self.pending):
+                self._flush(gender)
+
+    def close(self):
+        self.flush_all()
+        self.executor.shutdown(wait=True)
+        if self.requests_sent:
+            logging.info(f"Store stock: {self.lookups} lookups in {self.requests_sent} requests "
+                         f"({self.lookups / self.requests_sent:.1f} per request)")
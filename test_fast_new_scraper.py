@@ -1,11 +1,11 @@
 import requests
 import brotli
-from bs4 import BeautifulSoup
 import re
 import sys, os
 import json
 import atexit
 import csv
+import html_parser
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -17,10 +17,13 @@ import logging
 from collections import deque
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-import aiohttp
 import asyncio
 from queue import Queue
 import pandas as pd
+from rate_limiter import get_limiter
+from grid_discovery import extract_grid, scroll_until_stable
+from season_suffix import get_resolver
+from store_stock import apply_policy, fetch_store_stock
 
 # Setup logging
 logging.basicConfig(filename=f"logs/new_products_{time.time()}.log",
@@ -58,7 +61,11 @@ session.mount("http://", adapter)
 session.mount("https://", adapter)
 session.headers.update(HEADERS)
 
+page_limiter = get_limiter("product_page")
+suffix_resolver = get_resolver()
+
 def exit_handler():
+    suffix_resolver.save()
     output_file = os.path.join("All.json")
     with data_lock:
         with open(output_file, "w", encoding="utf-8") as f:
@@ -79,35 +86,15 @@ def extract_size(value):
     return size_map.get(value.strip().upper(), "Unknown")
 
 async def check_in_store_async(product_pre, sizes, gender):
-    headers = {
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "en-US,en;q=0.9",
-        "content-type": "application/json",
-        "user-agent": HEADERS["user-agent"]
-    }
-
-    suf_list = ["I2024", "V2025"]
-    async with aiohttp.ClientSession() as session:
-        for suf in suf_list:
-            base_url = "https://www.zara.com/in/en/store-stock?physicalStoreIds=16156&"
-            for size in sizes:
-                if size != "Unknown":
-                    reference = f"references={product_pre}{size}-{suf}&"
-                    base_url += reference
-            base_url += f"sectionName={gender.upper()}&ajax=true"
-            
-            try:
-                async with session.get(base_url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("productAvailability", []):
-                            return data
-            except Exception as e:
-                logging.info(f"Error fetching store availability: {e}")
-                await asyncio.sleep(1)  # Add delay on error
-    
-    return {"productAvailability": []}
+    references = [f"{product_pre}{size}" for size in sizes if size != "Unknown"]
+    # Every configured store in one request, with the season suffix learned for
+    # this sku; the lookup is blocking, so it runs on a worker thread
+    _, data = await asyncio.to_thread(
+        suffix_resolver.resolve,
+        product_pre,
+        lambda sufs: fetch_store_stock([f"{ref}-{suf}" for suf in sufs for ref in references], gender),
+    )
+    return apply_policy(data)
 
 def process_product(url, category, sub_category, gender):
     """Process a single product URL"""
@@ -118,9 +105,11 @@ def process_product(url, category, sub_category, gender):
             return
         return
         with session_lock:
+            page_limiter.acquire()
             response = session.get(url, headers=HEADERS)
+            page_limiter.report(response.status_code)
             response.raise_for_status()
-            product_soup = BeautifulSoup(response.content, 'html.parser')
+            product_soup = html_parser.parse(response.content)
 
         details = product_soup.select_one('div.layout-content.layout-catalog-content--full div.product-detail-view__main')
         if not details:
@@ -198,17 +187,6 @@ def process_product(url, category, sub_category, gender):
         logging.error(f"Error processing product {url}: {e}")
         time.sleep(1)  # Add delay on error
 
-def slow_scroll(driver, scroll_pause_time=1):
-    """Scroll the page slowly to load all content"""
-    last_height = driver.execute_script("return document.body.scrollHeight")
-    while True:
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(scroll_pause_time)
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
-
 def process_categories(categories):
     """Process all categories using a single browser instance"""
     driver = None
@@ -231,20 +209,11 @@ def process_categories(categories):
                 )
                 
                 # Scroll to load all products
-                slow_scroll(driver)
+                scroll_until_stable(driver)
                 
-                # Get all product URLs
-                product_elements = driver.find_elements(By.CSS_SELECTOR, 'ul.product-grid__product-list li.product-grid-product')
+                # Get all product URLs in a single script call
                 v2 = url.split("v1=")[1]
-                
-                product_urls = []
-                for product in product_elements:
-                    try:
-                        v1 = product.get_attribute("data-productid")
-                        product_url = f"{product.find_element(By.CSS_SELECTOR, 'div.product-grid-product__figure a').get_attribute('href')}?v1={v1}&v2={v2}"
-                        product_urls.append(product_url)
-                    except Exception as e:
-                        logging.error(f"Error extracting product URL: {e}")
+                product_urls = [item["url"] for item in extract_grid(driver, v2)]
                 
                 # Process products in parallel using ThreadPoolExecutor
                 with ThreadPoolExecutor(max_workers=5) as executor:
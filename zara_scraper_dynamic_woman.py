@@ -1,11 +1,13 @@
 import requests
 import brotli
-from bs4 import BeautifulSoup
 import re
 import os
 import json
 import atexit
 import csv
+import html_parser
+from season_suffix import get_resolver
+from store_stock import apply_policy, fetch_store_stock
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -13,8 +15,10 @@ from selenium.webdriver.support import expected_conditions as EC
 import time
 
 json_data = []
+suffix_resolver = get_resolver()
 
 def exit_handler():
+    suffix_resolver.save()
     output_file = os.path.join(gender + "All.json")
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(json_data, f, indent=4)    
@@ -123,9 +127,7 @@ def fetch_html_with_debugging(url):
         with open("debug_decoded_output.html", "w", encoding="utf-8") as f:
             f.write(response_text)
         
-        # Parse with BeautifulSoup
-        soup = BeautifulSoup(response_text, "html.parser")
-        # print("[DEBUG] BeautifulSoup object created successfully.")
+        soup = html_parser.parse(raw_content)
         
         # Debug: Output a snippet of the HTML
         # print(f"[DEBUG] HTML Snippet (first 500 chars):\n{response_text[:500]}")
@@ -226,47 +228,16 @@ def extract_size(value):
 
 
 def check_in_store(product_pre, sizes):
-
-    headers = {
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "en-US,en;q=0.9",
-        "cache-control": "no-cache",
-        "content-type": "application/json",
-        "sec-ch-ua": '"Chromium";v="130", "Google Chrome";v="130", "Not?A_Brand";v="99"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-dest": "empty",
-        "sec-fetch-mode": "cors",
-        "sec-fetch-site": "same-origin",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
-    }
-
-    suf_list = ["I2024", "V2025"]
-
-    # physicalStoreIds=9217&physicalStoreIds=16157&physicalStoreIds=9218
-
-    for suf in suf_list:
-        base_url = "https://www.zara.com/in/en/store-stock?physicalStoreIds=16156&" 
-
-        for size in sizes:
-            if size != "Unknown":
-                reference = "references=" + product_pre + size + "-" + suf + "&"
-                base_url += reference
-
-        base_url += "sectionName=" + gender.upper() + "&ajax=true"
-
-        print(base_url)
-
-        try:
-            response = requests.get(base_url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            if len(data.get("productAvailability", [])):       
-                print(f"[DEBUG] product {product_pre} FOUND in store")
-                return data
-        except requests.RequestException as e:
-            print(f"Error fetching store availability for: {e}")
+    references = [product_pre + size for size in sizes if size != "Unknown"]
+    # Every configured store in one request, with the season suffix learned for this sku
+    suf, data = suffix_resolver.resolve(
+        product_pre,
+        lambda sufs: fetch_store_stock([ref + "-" + suf for suf in sufs for ref in references], gender),
+    )
+    data = apply_policy(data)
+    if len(data.get("productAvailability", [])):
+        print(f"[DEBUG] product {product_pre} FOUND in store ({suf})")
+        return data
     print(f"[TRACE] product {product_pre} NOT AVAILABLE in store")
     return {"productAvailability": []}
 
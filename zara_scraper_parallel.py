@@ -1,97 +1,142 @@
-import requests
-import brotli
-from bs4 import BeautifulSoup
 import re
-import sys, os
-import json
+import sys
 import atexit
-import csv
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
+import argparse
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from functools import partial
 import logging
-import pandas as pd
+from fetch_engine import FetchEngine
+from rate_limiter import get_limiter
+from http_cache import PageCache
+from product_json import extract_product_fields
+import html_parser
+from category_client import fetch_category_products, load_category_rows
+from browser_pool import BrowserPool
+from grid_discovery import extract_grid, scroll_until_stable
+from pipeline import Pipeline
+from crawl_output import JsonlWriter, compact_jsonl
+from store_stock import StockBatcher, select_available, sizes_by_store
+from season_suffix import get_resolver
+from crawl_state import CrawlState, listing_fingerprint, listing_key
+from catalog_store import CatalogStore, import_snapshots
+from checkpoint import CHECKPOINT_FILE, Checkpoint, task_key
+from sku_index import KnownSkuIndex
 logging.basicConfig(filename=f"logs/new_products_{time.time()}.log",
                     filemode='a',
                     format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
                     datefmt='%H:%M:%S',
                     level=logging.DEBUG)
 logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
-# Shared data and locks
-json_data = []
-processed_products = []
-data_lock = Lock()
-session_lock = Lock()
-api_lock = Lock()
-
-# Shared session
-session = requests.Session()
+# Crawl results are streamed to stream_file as {"row", "entry"} lines while
+# the crawl runs (see crawl_output.JsonlWriter)
+stream_file = "crawl.jsonl"
+stream_writer = None
+# Progress of the current crawl, saved every CHECKPOINT_INTERVAL seconds for --resume
+checkpoint_file = CHECKPOINT_FILE
+CHECKPOINT_INTERVAL = 30.0
+checkpoint = None
+# Set by the entry point to also compact the stream into a legacy All.json at exit
+output_file = None
+
+# Shared async fetch engine for product pages (one connection pool for the run)
+engine = FetchEngine(concurrency=32, per_host=8, limiter=get_limiter("product_page"))
+# Validators and parsed fields from previous runs, for conditional GETs
+page_cache = PageCache()
+# Store-stock lookups from all fetch workers share requests, up to the URL limit
+stock_batcher = StockBatcher(flush_interval=0.25)
+# Listing fingerprints of the last crawl; unchanged products reuse their entries
+# until they are CRAWL_REFRESH_AGE seconds old
+CRAWL_REFRESH_AGE = 3 * 24 * 3600
+crawl_state = CrawlState(refresh_age=CRAWL_REFRESH_AGE)
+# Every written entry is also upserted into the SQLite catalog
+catalog_store = CatalogStore()
+# Season suffix per sku family, learned from payloads and store-stock answers
+suffix_resolver = get_resolver()
+# Long-lived discovery browsers, only started when the listing endpoint fails.
+# Categories are processed CATEGORY_WORKERS at a time.
+BROWSER_POOL_SIZE = 3
+BROWSER_MAX_PAGES = 25
+# Resource groups the discovery browsers refuse to load (see browser_pool.BLOCKED_URL_PATTERNS)
+BROWSER_BLOCKED = ("images", "media", "fonts", "analytics")
+CATEGORY_WORKERS = 3
+# Fetch workers mostly wait on the engine and the stock batcher; more of them
+# means more products per store-stock request
+FETCH_WORKERS = 48
+PIPELINE_QUEUE_SIZE = 256
+browser_pool = BrowserPool(size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES, blocked=BROWSER_BLOCKED)
+clients_closed = False
+
+def close_clients():
+    """Save state and shut the shared clients down; later calls do nothing."""
+    global clients_closed
+    if clients_closed:
+        return
+    clients_closed = True
+    if checkpoint:
+        checkpoint.save()
+    if stream_writer:
+        stream_writer.close()
+    engine.close()
+    stock_batcher.close()
+    page_cache.save()
+    crawl_state.save()
+    catalog_store.close()
+    suffix_resolver.save()
+    browser_pool.close()
 
 def exit_handler():
-    suf = "_new" if fetch_new else ""
-    output_file = os.path.join(f"All{suf}.json")
-    with data_lock:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(json_data, f, indent=4)
-        logging.info(f"Saved {len(json_data)} products")
+    close_clients()
+    if output_file and stream_writer:
+        entries = compact_jsonl([stream_file], output_file)
+        logging.info(f"Saved {len(entries)} products")
 
 atexit.register(exit_handler)
 
-HEADERS = {
-    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-    "accept-encoding": "gzip, deflate",
-    "accept-language": "en-US,en;q=0.9",
-    "cache-control": "no-cache",
-    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.199 Safari/537.36",
-}
-
-def slow_scroll(driver, scroll_pause_time=1, scroll_step=300):
-    total_height = driver.execute_script("return document.body.scrollHeight")
-    current_position = 0
-
-    while current_position < total_height:
-        driver.execute_script(f"window.scrollBy(0, {scroll_step});")
-        time.sleep(scroll_pause_time)
-        current_position += scroll_step
-        total_height = driver.execute_script("return document.body.scrollHeight")
-
-def open_category(url, scroll):
-    driver = uc.Chrome()
-    try:
-        driver.get(url)
-        wait = WebDriverWait(driver, 5)
-        wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
-        if scroll == 1:
-            slow_scroll(driver, scroll_pause_time=1, scroll_step=600)
-        return driver
-    except Exception as e:
-        logging.info(f"Error: {e}")
-        return None
+def open_category(driver, url, scroll):
+    driver.get(url)
+    wait = WebDriverWait(driver, 5)
+    wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+    if scroll == 1:
+        scroll_until_stable(driver)
 
 def fetch_html_with_debugging(url):
-    global session
     try:
-        with session_lock:
-            logging.info(f"[DEBUG] Starting fetch for URL: {url}")
-            response = session.get(url, headers=HEADERS)
-        response.raise_for_status()
-        
-        # Brotli decompression if needed
-        content_encoding = response.headers.get("content-encoding", "")
-        raw_content = response.content
-        if content_encoding == "br":
-            raw_content = brotli.decompress(raw_content)
-        
-        response_text = raw_content.decode("utf-8")
-        return BeautifulSoup(response_text, "html.parser")
+        logging.info(f"[DEBUG] Starting fetch for URL: {url}")
+        _, _, raw_content = engine.fetch(url)
+        return raw_content
     except Exception as e:
-        logging.info(f"[ERROR] Failed to fetch or parse the page. Exception {e}")
+        logging.info(f"[ERROR] Failed to fetch the page. Exception {e}")
         return None
 
+def parse_html(raw_content):
+    return html_parser.parse(raw_content)
+
+# Product detail selectors, compiled once for the active parser backend
+PRODUCT_SELECTORS = html_parser.compile_plan({
+    "details_root": 'div.product-detail-view__main',
+    "details": 'div.layout.layout--grid-type-standard.layout-catalog.product-detail-view  div.layout-content.layout-catalog-content--full div.product-detail-view__main',
+    "sizes": 'div.new-size-selector.product-detail-info__new-size-selector ul.size-selector-sizes.size-selector-sizes--grid-gap li',
+    "size_label": 'div.size-selector-sizes-size__label',
+    "reference": 'button.product-color-extended-name__copy-action',
+    "color": 'div.product-detail-view__side-bar div.product-detail-info__actions p[data-qa-qualifier="product-detail-info-color"]',
+    "name": 'div.product-detail-view__side-bar h1',
+    "price_discount": 'div.product-detail-view__side-bar div.product-detail-info__price span.price__amount.price__amount--on-sale.price__amount--is-highlighted.price-current--with-background.price-current--is-highlighted span.price-current__amount span.money-amount__main',
+    "price_old": 'div.product-detail-view__side-bar div.product-detail-info__price span.price__amount--old-price-wrapper span.money-amount__main',
+    "price": 'div.product-detail-view__side-bar div.product-detail-info__price span.money-amount__main',
+    "images": 'div.product-detail-view__main-content div.product-detail-images__frame ul.product-detail-images__images li picture.media-image source:nth-of-type(1)',
+})
+DETAILS_PATTERN = html_parser.element_pattern("product-detail-view__main")
+
+def parse_details(raw_content):
+    """Parse only the product-detail subtree, falling back to the full page."""
+    details = html_parser.parse_region(raw_content, DETAILS_PATTERN, PRODUCT_SELECTORS["details_root"])
+    if details is None:
+        details = parse_html(raw_content).select_one(PRODUCT_SELECTORS["details"])
+    return details
+
 size_map = {
     'XS': '01',
     'S': '02',
@@ -121,207 +166,295 @@ def extract_size(value):
     # If not 'EU ...', use the map for strings like 'L', 'XL', etc.
     return size_map.get(value.strip().upper(), "Unknown")
 
-def check_in_store(product_pre, sizes):
-
-    headers = {
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "en-US,en;q=0.9",
-        "cache-control": "no-cache",
-        "content-type": "application/json",
-        "sec-ch-ua": '"Chromium";v="130", "Google Chrome";v="130", "Not?A_Brand";v="99"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-dest": "empty",
-        "sec-fetch-mode": "cors",
-        "sec-fetch-site": "same-origin",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
-    }
-
-    suf_list = ["I2024", "V2025"]
-
-    # physicalStoreIds=9217&physicalStoreIds=16157&physicalStoreIds=9218
-
-    for suf in suf_list:
-        base_url = "https://www.zara.com/in/en/store-stock?physicalStoreIds=16156&" 
-
-        for size in sizes:
-            if size != "Unknown":
-                reference = "references=" + product_pre + size + "-" + suf + "&"
-                base_url += reference
-
-        base_url += "sectionName=" + gender.upper() + "&ajax=true"
-
-        logging.info(base_url)
-
-        try:
-            with api_lock:
-                response = requests.get(base_url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                if len(data.get("productAvailability", [])):       
-                    logging.info(f"[DEBUG] product {product_pre} FOUND in store")
-                    return data
-        except requests.RequestException as e:
-            logging.info(f"Error fetching store availability for: {e}")
+def check_in_store(product_pre, sizes, gender):
+    references = [product_pre + size for size in sizes if size != "Unknown"]
+    # Queued with lookups from the other fetch workers and sent as one request,
+    # trying the season suffix learned for this sku first (see SuffixResolver.resolve)
+    suf, data = suffix_resolver.resolve(
+        product_pre,
+        lambda sufs: stock_batcher.lookup([ref + "-" + suf for suf in sufs for ref in references], gender),
+    )
+    if len(data.get("productAvailability", [])):
+        logging.info(f"[DEBUG] product {product_pre} FOUND in store ({suf})")
+        return data
     logging.info(f"[TRACE] product {product_pre} NOT AVAILABLE in store")
     return {"productAvailability": []}
 
-# Add this near the top of your script, after the imports
-processed_products = []
+def parse_product_page(details):
+    """
+    Extract the page-level product fields from the product detail subtree.
 
-def process_product(url):
-    global processed_products, json_data
-    sku_id = re.search(r'p(\d+)\.html', url).group(1)
-    logging.info(f"Processing product URL: {url}")
-    product_soup = fetch_html_with_debugging(url)
-    if not product_soup:
-        logging.info(f"Failed to create driver for {url}")
-        return
-    details = product_soup.select_one('div.layout.layout--grid-type-standard.layout-catalog.product-detail-view  div.layout-content.layout-catalog-content--full div.product-detail-view__main')
+    Returns:
+    - dict | None: name, prices, color, color code, store reference prefix,
+      size codes and image URLs; None when the detail view is missing.
+    """
+    plan = PRODUCT_SELECTORS
+    if not details:
+        return None
     sizes_num = []
-    sizes_dt = details.select('div.new-size-selector.product-detail-info__new-size-selector ul.size-selector-sizes.size-selector-sizes--grid-gap li')
+    sizes_dt = details.select(plan["sizes"])
     for size in sizes_dt:
-        s = size.select_one('div.size-selector-sizes-size__label').text
+        s = size.select_one(plan["size_label"]).text
         sizes_num.append(extract_size(s))
 
-    reference_pre = "0" + details.select_one('button.product-color-extended-name__copy-action').text.replace("/", "")
-    store_data = check_in_store(reference_pre, sizes_num).get("productAvailability", [])
-    
-    # Move the product entry creation outside the store_data loop
-    # This ensures we create a product entry even if store_data is empty
-    if store_data:
-        for store in store_data:
-            color_dt = details.select_one('div.product-detail-view__side-bar div.product-detail-info__actions p[data-qa-qualifier="product-detail-info-color"]').text
-            color = color_dt.split("|")[0]
-            if "Colour" in color:
-                color = color.split(":")[1].strip()
-            else: 
-                color = color.strip()
-            color_code = color_dt.split("|")[1][-3:]    
-
-            product_id = sku_id + color_code
-            with data_lock:
-                if product_id in processed_products:
-                    logging.info(f"Duplicate product detected {product_id}, skipping")
-                    return
-                processed_products.append(product_id)
-
-            size_avil = ""
-            available_products = store.get("availableProducts", [])
-            for product in available_products:
-                size_avil += product.get("size") + ","
-
-            name = details.select_one('div.product-detail-view__side-bar h1').text
-
-            price_discount_dt = details.select_one('div.product-detail-view__side-bar div.product-detail-info__price span.price__amount.price__amount--on-sale.price__amount--is-highlighted.price-current--with-background.price-current--is-highlighted span.price-current__amount span.money-amount__main')
-            price_discount = re.sub(r"[^\d.,]", "", price_discount_dt.text) if price_discount_dt else "0"
-            if price_discount != "0":
-                price = re.sub(r"[^\d.,]", "", details.select_one('div.product-detail-view__side-bar div.product-detail-info__price span.price__amount--old-price-wrapper span.money-amount__main').text)
-            else:    
-                price = re.sub(r"[^\d.,]", "", details.select_one('div.product-detail-view__side-bar div.product-detail-info__price span.money-amount__main').text)
-                price_discount = price
-
-            images_dt = details.select("div.product-detail-view__main-content div.product-detail-images__frame ul.product-detail-images__images li picture.media-image source:nth-of-type(1)")
-            image_urls = ""
-            url_pattern = r'https?://[^\s,]+'
-            for image in images_dt:
-                links = image.get("srcset")
-                urls = re.findall(url_pattern, links)
-                image_urls += urls[-1] if urls else ""
-                image_urls += ","
-
-            product_entry = {
-                "category": category.lower(),
-                "subcategory": sub_category.lower(),
-                "name": name,
-                "price": price_discount,
-                "image_urls": image_urls,
-                "product_link": url,
-                "sku_id": sku_id, 
-                "sizes": size_avil,
-                "gender": gender,
-                "original_price": price,
-                "color": color,
-                "color_code": color_code
-            }
-
-            # Append to shared JSON data safely
-            with data_lock:
-                json_data.append(product_entry)
-                logging.info(f"Added product {product_id} to dump")
+    reference_pre = "0" + details.select_one(plan["reference"]).text.replace("/", "")
+
+    color_dt = details.select_one(plan["color"]).text
+    color = color_dt.split("|")[0]
+    if "Colour" in color:
+        color = color.split(":")[1].strip()
+    else: 
+        color = color.strip()
+    color_code = color_dt.split("|")[1][-3:]    
+
+    name = details.select_one(plan["name"]).text
+
+    price_discount_dt = details.select_one(plan["price_discount"])
+    price_discount = re.sub(r"[^\d.,]", "", price_discount_dt.text) if price_discount_dt else "0"
+    if price_discount != "0":
+        price = re.sub(r"[^\d.,]", "", details.select_one(plan["price_old"]).text)
+    else:    
+        price = re.sub(r"[^\d.,]", "", details.select_one(plan["price"]).text)
+        price_discount = price
+
+    images_dt = details.select(plan["images"])
+    image_urls = ""
+    url_pattern = r'https?://[^\s,]+'
+    for image in images_dt:
+        links = image.get("srcset", "")
+        urls = re.findall(url_pattern, links)
+        image_urls += urls[-1] if urls else ""
+        image_urls += ","
+
+    return {
+        "name": name,
+        "price": price_discount,
+        "original_price": price,
+        "color": color,
+        "color_code": color_code,
+        "reference_pre": reference_pre,
+        "sizes_num": sizes_num,
+        "image_urls": image_urls,
+    }
+
+def category_fields(row):
+    """The fields of a product entry that come from its categories CSV row (see process_product)."""
+    return {
+        "category": row.get("Category", "").strip().lower(),
+        "subcategory": row.get("Sub Category", "").strip().lower(),
+        "gender": row.get("Gender", "").strip(),
+    }
+
+def process_product(url, raw_content=None, fields=None, row=None):
+    """
+    Build the product entries for one product page.
+
+    Returns:
+    - list: The product's entry (sizes per STORE_POLICY plus a per-store
+      `stores` map), or an empty list when it is unavailable, for the writer.
+    """
+    entries = []
+    sku_id = re.search(r'p(\d+)\.html', url).group(1)
+    logging.info(f"Processing product URL: {url}")
+    if fields is None:
+        if raw_content is None:
+            raw_content = fetch_html_with_debugging(url)
+        if not raw_content:
+            logging.info(f"Failed to fetch {url}")
+            return entries
+        # Embedded JSON fast path, CSS selectors when the payload is missing
+        fields = extract_product_fields(raw_content, url)
+        if fields is None:
+            fields = parse_product_page(parse_details(raw_content))
+        if not fields:
+            logging.info(f"No product details found on {url}")
+            return entries
+        page_cache.store_parsed(url, fields)
+    else:
+        logging.info(f"Page unchanged since last crawl, reusing parsed fields for {url}")
+
+    row_fields = category_fields(row)
+    # Cached fields from before the season was extracted have no "season" key
+    suffix_resolver.learn(fields["reference_pre"], fields.get("season"))
+    store_data = check_in_store(fields["reference_pre"], fields["sizes_num"], row_fields["gender"])
+    stores = sizes_by_store(store_data)
+    available = select_available(stores)
+
+    if available:
+        # One entry per product: `sizes` follows STORE_POLICY, `stores` keeps
+        # the per-store sizes. Duplicate sku+color entries from other
+        # categories are dropped deterministically by crawl_output.compact
+        product_entry = {
+            **row_fields,
+            "name": fields["name"],
+            "price": fields["price"],
+            "image_urls": fields["image_urls"],
+            "product_link": url,
+            "sku_id": sku_id, 
+            "sizes": "".join(size + "," for size in available.values()),
+            "original_price": fields["original_price"],
+            "color": fields["color"],
+            "color_code": fields["color_code"],
+            "stores": {
+                str(store_id): "".join(size + "," for size in store_sizes.values())
+                for store_id, store_sizes in stores.items()
+            },
+        }
+
+        entries.append(product_entry)
     else:
         # If no store data, you might want to log this or handle it differently
         logging.info(f"No store data found for product: {url}")
+    return entries
 
-master_skus = []
-def process_category(url, scroll):
-    driver = open_category(url, scroll)
-    if not driver:
-        logging.info(f"Failed to open category page: {url}")
-        return
+def fetch_product(task):
+    """
+    Pipeline worker: download one product page and turn it into entries.
+
+    Returns a single (task key, [(row_index, product_entry), ...]) result, so
+    the writer can mark the task complete once its entries are written. A
+    failed fetch returns nothing and the task stays pending in the checkpoint.
+    """
+    item, row = task
+    url = item["url"]
+    key, fingerprint = listing_key(item), listing_fingerprint(item)
+    entries = crawl_state.reusable(key, fingerprint)
+    if entries is not None:
+        logging.info(f"Listing unchanged since last crawl, reusing entries for {url}")
+        # The same product can be listed under several categories
+        entries = [dict(product_entry, product_link=url, **category_fields(row)) for product_entry in entries]
+        return [(task_key(item, row), [(row["_row_index"], product_entry) for product_entry in entries])]
+
+    status, headers, raw_content = engine.fetch(url, page_cache.request_headers(url))
+    if raw_content is None:
+        return []
+    fields = page_cache.lookup(url, status, headers, raw_content)
+    if fields is not None:
+        entries = process_product(url, fields=fields, row=row)
+    else:
+        entries = process_product(url, raw_content, row=row)
+    crawl_state.record(key, fingerprint, entries)
+    return [(task_key(item, row), [(row["_row_index"], product_entry) for product_entry in entries])]
+
+def write_product(result):
+    """Pipeline sink: stream a task's (row_index, product_entry) pairs to the output file and the catalog."""
+    key, tagged_entries = result
+    for row_index, product_entry in tagged_entries:
+        stream_writer.write(row_index, product_entry)
+        catalog_store.upsert_entry(product_entry, row_index)
+        logging.info(f"Added product {product_entry['sku_id']}{product_entry['color_code']} to dump")
+    checkpoint.completed(key)
+
+# Skus already on Shopify; Handles and listing sku ids are compared as numbers,
+# so '05070660' matches Handle '5070660'
+known_skus = KnownSkuIndex()
+def discover_products_in_browser(url, scroll):
     v2 = url.split("v1=")[1]
     try:
-        product_elements = driver.find_elements(By.CSS_SELECTOR, 'ul.product-grid__product-list li.product-grid-product')
-        logging.info(f"**********Processing Category {category}**********")
-        product_urls = []
-        sku_id = ""
-        for product in product_elements:
-            try:
-                v1 = product.get_attribute("data-productid")
-                product_url_element = product.find_element(By.CSS_SELECTOR, "div.product-grid-product__figure a")
-                
-                sku_id = re.search(r'p(\d+)\.html', product_url_element.get_attribute("href")).group(1)  
-                if sku_id in master_skus: 
-                    logging.info(f"sku_id {sku_id} already on Shopin, skipping")
-                    continue
-                else:
-                    logging.info(f"sku_id {sku_id} new product added to Zara")
-                product_url = product_url_element.get_attribute("href") +  "?v1=" + v1 + "&v2=" + v2
-                product_urls.append(product_url)
-            except Exception as e:
-                logging.info(f"[ERROR] Failed to extract product URL: {e}")
-
-        # Process products in parallel
-        
-        # if sku_id == "05584361":
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            executor.map(process_product, product_urls)
-
-    finally:
-        driver.quit()
+        with browser_pool.lease() as driver:
+            open_category(driver, url, scroll)
+            return extract_grid(driver, v2)
+    except Exception as e:
+        logging.info(f"Failed to open category page: {url} ({e})")
+        return None
+
+def discover_products(url, scroll):
+    """List a category's products, preferring the JSON endpoint over the browser."""
+    listing = fetch_category_products(url)
+    if listing is None:
+        logging.info(f"Listing endpoint unavailable, scrolling {url} in the browser")
+        listing = discover_products_in_browser(url, scroll)
+    return listing
+
+def process_category(row, scroll, pipeline):
+    """
+    Discover one category and queue its products. A failure only skips this
+    category; it is not marked done, so --resume tries it again.
+    """
+    try:
+        queue_category(row, scroll, pipeline)
+    except Exception as e:
+        logging.info(f"[ERROR] Failed to process category {row.get('Link', '').strip()}: {e}")
+
+def queue_category(row, scroll, pipeline):
+    url = row.get("Link", "").strip()
+    listing = discover_products(url, scroll)
+    if listing is None:
+        return
+    logging.info(f"**********Processing Category {row.get('Category', '').strip()}**********")
+    for item in listing:
+        if item["sku_id"] in known_skus:
+            logging.info(f"sku_id {item['sku_id']} already on Shopin, skipping")
+            continue
+        else:
+            logging.info(f"sku_id {item['sku_id']} new product added to Zara")
+        key = task_key(item, row)
+        if checkpoint.is_known(key):
+            continue
+        checkpoint.submitted(key, item, row["_row_index"])
+        # Blocks while the fetch workers are PIPELINE_QUEUE_SIZE products behind
+        pipeline.submit((item, row))
+    checkpoint.category_done(row["_row_index"])
+
 def fetch_master_skus(csv_master_file):
-    global master_skus
-    with open(csv_master_file, "r", encoding="utf-8") as infile:
-        reader = csv.DictReader(infile, delimiter=",")    
-        for row in reader:    
-           master_skus.append(row["sku_base"]) 
+    known_skus.update_from_csv(csv_master_file, column="sku_base")
+    known_skus.save()
 
 def get_unique_handles_fast(csv_file):
-    global master_skus
     """
-    Very fast function to get unique handles from CSV file using pandas.
-    
+    Make sure every Handle of a master CSV is in the known-sku index, and
+    its Shopify ids are in the catalog store for the exporters.
+
+    The index is persisted, so the CSV is only read again when it changed
+    since the index was last saved.
+
     Args:
         csv_file: Path to the combined CSV file
-        
-    Returns:
-        list: List of unique handles
     """
-    # Read only the Handle column
-    handles = pd.read_csv(csv_file, usecols=['Handle'])['Handle'].unique()
-    master_skus = handles.tolist()    
+    if known_skus.is_stale(csv_file):
+        known_skus.update_from_csv(csv_file, replace=True)
+        import_snapshots(catalog_store, shopify_files=[csv_file])
+        known_skus.save()
+
+def crawl(rows, scroll=1, resume=False):
+    """
+    Crawl every categories CSV row, streaming results to stream_file.
+
+    Each row must carry "_row_index", its position in the category list, so
+    output can be compacted deterministically (see crawl_output.compact).
+    With resume, progress is picked up from checkpoint_file: finished
+    categories are skipped, pending products are resubmitted and the
+    stream is appended to, so already-written products are kept.
+    """
+    global stream_writer, checkpoint
+    stream_writer = JsonlWriter(stream_file, append=resume)
+    if resume:
+        checkpoint = Checkpoint.load(rows, checkpoint_file, interval=CHECKPOINT_INTERVAL, flush=stream_writer.flush)
+    else:
+        checkpoint = Checkpoint(rows, checkpoint_file, interval=CHECKPOINT_INTERVAL, flush=stream_writer.flush)
+    # Discovery (CATEGORY_WORKERS threads) streams product URLs into the
+    # pipeline while FETCH_WORKERS threads fetch and parse and one thread writes
+    pipeline = Pipeline(fetch_product, write_product, workers=FETCH_WORKERS, queue_size=PIPELINE_QUEUE_SIZE).start()
+    # Products that were queued or in flight when the last run stopped
+    rows_by_index = {row["_row_index"]: row for row in rows}
+    for item, row_index in list(checkpoint.pending.values()):
+        pipeline.submit((item, rows_by_index[row_index]))
+    remaining = [row for row in rows if row["_row_index"] not in checkpoint.categories]
+    with ThreadPoolExecutor(max_workers=CATEGORY_WORKERS) as executor:
+        list(executor.map(partial(process_category, scroll=scroll, pipeline=pipeline), remaining))
+    pipeline.close()
+    checkpoint.save(finished=True)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the categories CSV into All.json.")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted crawl from its checkpoint")
+    args = parser.parse_args()
+
     file_path = "csv/categories_test.csv"  # Replace with the actual path to your CSV file
     fetch_new = True
     if fetch_new:
         get_unique_handles_fast("master_merge.csv")
-    with open(file_path, mode="r", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            category = row.get("Category", "").strip()
-            sub_category = row.get("Sub Category", "").strip()
-            link = row.get("Link", "").strip()
-            gender = row.get("Gender", "").strip()
-            process_category(link, scroll=1)
+    suf = "_new" if fetch_new else ""
+    output_file = f"All{suf}.json"
+    stream_file = f"All{suf}.jsonl"
+    crawl(load_category_rows([file_path]), resume=args.resume)
@@ -1,11 +1,11 @@
 import requests
 import brotli
-from bs4 import BeautifulSoup
 import re
 import sys, os
 import json
 import atexit
 import csv
+import html_parser
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -14,18 +14,21 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 import logging
+from season_suffix import get_resolver
+from store_stock import apply_policy, fetch_store_stock
 logging.basicConfig(level=logging.INFO)
 # Shared data and locks
 json_data = []
 processed_products = []
 data_lock = Lock()
 session_lock = Lock()
-api_lock = Lock()
+suffix_resolver = get_resolver()
 
 # Shared session
 session = requests.Session()
 
 def exit_handler():
+    suffix_resolver.save()
     output_file = os.path.join(gender + "All.json")
     with data_lock:
         with open(output_file, "w", encoding="utf-8") as f:
@@ -79,8 +82,7 @@ def fetch_html_with_debugging(url):
         if content_encoding == "br":
             raw_content = brotli.decompress(raw_content)
         
-        response_text = raw_content.decode("utf-8")
-        return BeautifulSoup(response_text, "html.parser")
+        return html_parser.parse(raw_content)
     except Exception as e:
         logging.info(f"[ERROR] Failed to fetch or parse the page. Exception {e}")
         return None
@@ -113,48 +115,16 @@ def extract_size(value):
     return size_map.get(value.strip().upper(), "Unknown")
 
 def check_in_store(product_pre, sizes):
-
-    headers = {
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "en-US,en;q=0.9",
-        "cache-control": "no-cache",
-        "content-type": "application/json",
-        "sec-ch-ua": '"Chromium";v="130", "Google Chrome";v="130", "Not?A_Brand";v="99"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-dest": "empty",
-        "sec-fetch-mode": "cors",
-        "sec-fetch-site": "same-origin",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
-    }
-
-    suf_list = ["I2024", "V2025"]
-
-    # physicalStoreIds=9217&physicalStoreIds=16157&physicalStoreIds=9218
-
-    for suf in suf_list:
-        base_url = "https://www.zara.com/in/en/store-stock?physicalStoreIds=16156&" 
-
-        for size in sizes:
-            if size != "Unknown":
-                reference = "references=" + product_pre + size + "-" + suf + "&"
-                base_url += reference
-
-        base_url += "sectionName=" + gender.upper() + "&ajax=true"
-
-        logging.info(base_url)
-
-        try:
-            with api_lock:
-                response = requests.get(base_url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                if len(data.get("productAvailability", [])):       
-                    logging.info(f"[DEBUG] product {product_pre} FOUND in store")
-                    return data
-        except requests.RequestException as e:
-            logging.info(f"Error fetching store availability for: {e}")
+    references = [product_pre + size for size in sizes if size != "Unknown"]
+    # Every configured store in one request, with the season suffix learned for this sku
+    suf, data = suffix_resolver.resolve(
+        product_pre,
+        lambda sufs: fetch_store_stock([ref + "-" + suf for suf in sufs for ref in references], gender),
+    )
+    data = apply_policy(data)
+    if len(data.get("productAvailability", [])):
+        logging.info(f"[DEBUG] product {product_pre} FOUND in store ({suf})")
+        return data
     logging.info(f"[TRACE] product {product_pre} NOT AVAILABLE in store")
     return {"productAvailability": []}
 